@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+Measures how fast Test and Result objects are built from server responses.
+
+No Testrail server is needed: responses are generated locally and served
+instead of real API calls. JSON parsing rate of the same payload is printed
+as the upper bound.
+
+Usage: python testrail-benchmark.py [number of tests] [number of results]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+import json
+import time
+
+import testrail
+from testrail import Testrail
+
+TESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+RESULTS = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+CUSTOM_CASE_FIELDS = 10
+CUSTOM_RESULT_FIELDS = 5
+
+STAMP = 1400000000
+
+
+def custom_field(field_id, name):
+    return {
+        'id': field_id, 'type_id': 1, 'name': name,
+        'system_name': 'custom_' + name, 'label': name, 'description': '',
+        'display_order': field_id,
+        'configs': [{'id': field_id,
+                     'context': {'is_global': False, 'project_ids': ['1']},
+                     'options': {'is_required': False}}]
+    }
+
+
+def run(run_id):
+    attributes = dict.fromkeys([
+        'description', 'url', 'plan_id', 'milestone_id', 'assignedto_id',
+        'completed_on', 'config', 'passed_count', 'failed_count',
+        'retest_count', 'blocked_count', 'untested_count',
+        'custom_status1_count', 'custom_status2_count',
+        'custom_status3_count', 'custom_status4_count',
+        'custom_status5_count', 'custom_status6_count',
+        'custom_status7_count'
+    ])
+    attributes.update(id=run_id, name='Nightly', project_id=1, suite_id=1,
+                      created_on=STAMP, created_by=1, is_completed=False,
+                      config_ids=[], include_all=True)
+    return attributes
+
+
+def test(test_id):
+    attributes = {
+        'id': test_id, 'run_id': 1, 'case_id': test_id, 'status_id': 3,
+        'title': 'Test case number %s' % test_id, 'type_id': 1,
+        'priority_id': 2, 'milestone_id': None, 'refs': 'REQ-1',
+        'estimate': '1m', 'estimate_forecast': None, 'assignedto_id': 1
+    }
+    for i in range(CUSTOM_CASE_FIELDS):
+        attributes['custom_case%s' % i] = 'value %s' % i
+    return attributes
+
+
+def result(result_id):
+    attributes = {
+        'id': result_id, 'test_id': result_id % TESTS + 1, 'status_id': 1,
+        'version': '1.0.%s' % (result_id % 10),
+        'created_on': STAMP + result_id, 'created_by': 1,
+        'assignedto_id': None, 'comment': 'All fine', 'elapsed': '1m 5s',
+        'defects': None
+    }
+    for i in range(CUSTOM_RESULT_FIELDS):
+        attributes['custom_result%s' % i] = 'value %s' % i
+    return attributes
+
+
+RESPONSES = {
+    'get_users': json.dumps([{'id': 1, 'name': 'QA', 'email': 'qa@qa.qa',
+                              'is_active': True}]),
+    'get_case_fields': json.dumps([
+        custom_field(i, 'case%s' % i) for i in range(CUSTOM_CASE_FIELDS)
+    ]),
+    'get_result_fields': json.dumps([
+        custom_field(100 + i, 'result%s' % i)
+        for i in range(CUSTOM_RESULT_FIELDS)
+    ]),
+    'get_project/1': json.dumps({
+        'id': 1, 'name': 'Benchmark', 'url': '', 'suite_mode': 3,
+        'announcement': '', 'show_announcement': False,
+        'is_completed': False, 'completed_on': None
+    }),
+    'get_run/1': json.dumps(run(1)),
+    'get_tests/1': json.dumps([test(i) for i in range(1, TESTS + 1)]),
+    'get_results_for_run/1': json.dumps([
+        result(i) for i in range(1, RESULTS + 1)
+    ]),
+}
+
+
+def serve(url, **kwargs):
+    return json.loads(RESPONSES[url])
+
+
+def rate(count, function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.time()
+        function()
+        spent = time.time() - started
+        if best is None or spent < best:
+            best = spent
+    return count / best
+
+
+def reset_caches():
+    for object_class in (testrail.Project, testrail.Run,
+                         testrail.Test, testrail.Result):
+        object_class.cache = {}
+
+
+def main():
+    Testrail.get = staticmethod(serve)
+
+    print('%s tests, %s results' % (TESTS, RESULTS))
+    print('json.loads only:  %10.0f tests/sec  %10.0f results/sec' % (
+        rate(TESTS, lambda: serve('get_tests/1')),
+        rate(RESULTS, lambda: serve('get_results_for_run/1'))
+    ))
+
+    for lazy in (False, True):
+        Testrail.lazy = lazy
+        reset_caches()
+        nightly = Testrail.get_run_by_id(1)
+        print('%-17s %10.0f tests/sec  %10.0f results/sec' % (
+            'lazy=%s:' % lazy,
+            rate(TESTS, nightly.tests),
+            rate(RESULTS, nightly.results)
+        ))
+
+
+if __name__ == '__main__':
+    main()
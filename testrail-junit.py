@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+Imports results from JUnit/xUnit XML report into a Testrail run.
+
+Usage:
+    python testrail-junit.py --host 192.168.1.1 --user someuser@domain.dom \
+        --password somepassword --project 'My Project' --suite 'My Suite' \
+        report.xml
+
+Report is read from stdin when its path is '-'.
+Without --run-id a new run with matched cases is created.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+
+from testrail import Testrail, UploadJournal, import_junit
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Import JUnit/xUnit XML report into Testrail run.'
+    )
+    parser.add_argument('report', help='Path to XML report, - for stdin')
+    parser.add_argument('--host', default=os.environ.get('TESTRAIL_HOST', ''))
+    parser.add_argument('--port', default=os.environ.get('TESTRAIL_PORT', '80'))
+    parser.add_argument('--user', default=os.environ.get('TESTRAIL_USER', ''))
+    parser.add_argument('--password',
+                        default=os.environ.get('TESTRAIL_PASSWORD', ''))
+    parser.add_argument('--project', required=True, help='Project name')
+    parser.add_argument('--suite', required=True, help='Suite name')
+    parser.add_argument('--run-id', type=int,
+                        help='Add results to existing run')
+    parser.add_argument('--run-name', help='Name of the new run')
+    parser.add_argument('--property', default='testrail_case_id',
+                        help='Name of testcase property holding case id')
+    parser.add_argument('--version', help='Version of tested product')
+    parser.add_argument('--size', type=int, default=100,
+                        help='Max number of results sent with one request')
+    parser.add_argument('--journal',
+                        help='Journal file to make repeated imports safe')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    Testrail(host=args.host, port=args.port,
+             user=args.user, password=args.password)
+
+    suite = Testrail.get_project_by_name(args.project).get_suite_by_name(
+        args.suite
+    )
+    run = Testrail.get_run_by_id(args.run_id) if args.run_id else None
+    journal = UploadJournal(args.journal) if args.journal else None
+
+    if args.report == '-':
+        report = getattr(sys.stdin, 'buffer', sys.stdin)
+    else:
+        report = args.report
+
+    imported = import_junit(report, suite, run=run,
+                            run_name=args.run_name,
+                            case_property=args.property,
+                            version=args.version, size=args.size,
+                            journal=journal)
+
+    if imported.run is not None:
+        print('%s results sent to run "%s" (id %s)' % (
+            imported.sent, imported.run.name, imported.run.id
+        ))
+    for data, error in imported.errors:
+        print('case C%s rejected: %s' % (data['case_id'], error))
+    for name in imported.unmatched:
+        print('no case for %s' % name)
+
+    return 1 if imported.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
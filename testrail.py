@@ -11,9 +11,17 @@ user interface. Also bulk methods provided by API is quite useless in script,
 which can easily do bulk operations itself. So I did not implement some methods
 to keep it simple.
 
-One thing to remember = this module is not designed for long-time work, it is
-for single-run scripts. So it will be better to re-run entire script rather
-than do something in endless loop.
+By default this module is for single-run scripts: loaded objects stay in
+memory to the end of the script and metadata (users, statuses, custom fields,
+...) is never reloaded. For long-running processes (services, dashboards)
+turn on service mode:
+
+    Testrail.service_mode(ttl=300, max_objects=100000, metadata_ttl=3600)
+
+Then objects are loaded again when they are older than 'ttl' seconds, at most
+'max_objects' of every kind are kept, and metadata is reloaded every
+'metadata_ttl' seconds (or by Testrail.refresh_metadata()). Get objects by id
+when you need them instead of keeping them for a long time.
 """
 #TODO: Previous versions support
 #TODO: Test Plan full support
@@ -24,7 +32,18 @@ from __future__ import print_function
 import time
 import datetime
 import json
-from collections import defaultdict
+import array
+import atexit
+import threading
+import os
+import uuid
+import hashlib
+import itertools
+import bisect
+import re
+import tempfile
+from collections import defaultdict, namedtuple, Counter, OrderedDict
+from operator import itemgetter
 
 try:
     import requests
@@ -32,6 +51,21 @@ try:
 except ImportError:
     raise RuntimeError('Module "requests" is required.')
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 __author__ = 'Vyacheslav Spiridonov'
 
@@ -60,6 +94,14 @@ class AccessDenied(Exception):
     pass
 
 
+class ServerError(Exception):
+    """
+    Will be raised (or reported) when server returns unexpected response, e.g.
+    on internal error or when too many requests are sent.
+    """
+    pass
+
+
 ################################################################################
 # Service Classes
 ################################################################################
@@ -84,6 +126,66 @@ class _Comparable(object):
         return not other < self
 
 
+class _ObjectCache(object):
+    """
+    Cache of objects by id for service mode: objects are forgotten 'ttl'
+    seconds after they were loaded, and the oldest ones are forgotten when
+    there are more than 'size' of them.
+    """
+
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+
+        # {id: (time loaded, object)} - in order of loading
+        self._objects = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __setitem__(self, object_id, obj):
+        with self._lock:
+            self._objects.pop(object_id, None)
+            self._objects[object_id] = (time.time(), obj)
+
+            while len(self._objects) > self.size:
+                self._objects.popitem(last=False)
+
+    def __getitem__(self, object_id):
+        with self._lock:
+            loaded, obj = self._objects[object_id]
+
+            if time.time() - loaded > self.ttl:
+                del self._objects[object_id]
+                raise KeyError(object_id)
+
+            return obj
+
+    def __delitem__(self, object_id):
+        with self._lock:
+            del self._objects[object_id]
+
+    def __contains__(self, object_id):
+        return self.get(object_id) is not None
+
+    def __len__(self):
+        return len(self._objects)
+
+    def get(self, object_id, default=None):
+        try:
+            return self[object_id]
+        except KeyError:
+            return default
+
+    def values(self):
+        with self._lock:
+            expired = time.time() - self.ttl
+            return [obj for loaded, obj in self._objects.values()
+                    if loaded >= expired]
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+
 class _TestrailObject(object):
 
     cache = None
@@ -106,6 +208,317 @@ class _TestrailObject(object):
     def __str__(self):
         return '<%s object [%s]>' % (self.__class__.__name__, self.id)
 
+    ############################################################################
+    # Lazy mode support
+    #
+    # In lazy mode objects keep the raw payload and decode expensive attributes
+    # (listed in _lazy_attributes) and custom fields of the project (listed in
+    # _custom_names) only on first access.
+
+    # {attribute name: function(attributes) -> value}
+    _lazy_attributes = {}
+
+    def _defer_attributes(self, attributes):
+        self._forget_decoded()
+        self._attributes = attributes
+
+    def _forget_decoded(self):
+        # forget everything decoded from the previous payload
+        for name in list(self.__dict__):
+            if name in self._lazy_attributes or name.startswith('custom_') \
+                    or name in ('_attributes', '_custom_names'):
+                del self.__dict__[name]
+
+    def __getattr__(self, name):
+        # Called only when attribute is not settled yet
+        try:
+            attributes = self.__dict__['_attributes']
+        except KeyError:
+            raise AttributeError(name)
+
+        if name in self._lazy_attributes:
+            value = self._lazy_attributes[name](attributes)
+        elif name in self.__dict__.get('_custom_names', ()):
+            value = attributes.get(name)
+        else:
+            raise AttributeError(name)
+
+        # memoize decoded value
+        setattr(self, name, value)
+        return value
+
+    ############################################################################
+    # Generated hydrators
+    #
+    # Classes with _system_fields are settled by a function generated for the
+    # class and the custom fields of the project, so all attributes are
+    # assigned in straight-line code without loops and lookups per object.
+
+    # ((attribute name, payload key), ...)
+    _system_fields = ()
+
+    # ((attribute name, payload key), ...) - UNIX timestamps to decode
+    _stamp_fields = ()
+
+    # names of system attributes with few distinct values, which are shared
+    # through Testrail.strings when Testrail.intern_strings is on
+    _interned_fields = ()
+
+    @staticmethod
+    def _custom_fields(attributes):
+        """
+        Override me: return custom fields applicable to object with provided
+        attributes.
+        """
+        return ()
+
+    @classmethod
+    def _hydrator(cls, custom_fields):
+        return _get_hydrator(cls, *_custom_field_names(custom_fields))
+
+    def _hydrate(self, attributes):
+        self._hydrator(self._custom_fields(attributes))(self, attributes)
+
+    @classmethod
+    def _build_many(cls, payloads, custom_fields):
+        """
+        Create objects from list of payloads sharing same custom fields.
+
+        :arg payloads: list of dictionaries with object fields
+        :arg custom_fields: list of CaseField or ResultField objects
+        """
+        hydrate = cls._hydrator(custom_fields)
+        cache = cls.cache
+
+        objects = []
+        for attributes in payloads:
+            obj = cls.__new__(cls)
+            hydrate(obj, attributes)
+            cache[obj.id] = obj
+            objects.append(obj)
+
+        return objects
+
+
+def _datetime_from_stamp(stamp):
+    """
+    Convert UNIX timestamp from server to datetime object (None stays None).
+    """
+    if stamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(float(stamp))
+
+
+def _stamp_decoder(key):
+    return lambda attributes: _datetime_from_stamp(attributes[key])
+
+
+# Custom field types (Dropdown) to share values of
+_INTERNED_CUSTOM_TYPES = (6, )
+
+_hydrators = {}
+
+# {id(custom fields list): (custom fields list, names, interned names)}
+_field_names = {}
+
+
+def _custom_field_names(custom_fields):
+    """
+    Return names of custom fields and names of those with shared values,
+    resolved once for every list of custom fields (i.e. once per project).
+    """
+    try:
+        fields, names, interned_names = _field_names[id(custom_fields)]
+        if fields is custom_fields:
+            return names, interned_names
+    except KeyError:
+        pass
+
+    names = tuple(f.system_name for f in custom_fields)
+    interned_names = tuple(f.system_name for f in custom_fields
+                           if f.type_id in _INTERNED_CUSTOM_TYPES)
+    # the list is kept, so its id is not reused by another one
+    _field_names[id(custom_fields)] = (custom_fields, names, interned_names)
+    return names, interned_names
+
+
+def _share(value):
+    """
+    Return shared object equal to value (see Testrail.intern_strings).
+    Once Testrail.max_strings values are shared, new ones are kept as they are.
+    """
+    strings = Testrail.strings
+    try:
+        return strings[value]
+    except KeyError:
+        if Testrail.max_strings is not None and \
+                len(strings) >= Testrail.max_strings:
+            return value
+        return strings.setdefault(value, value)
+
+
+def _get_hydrator(object_class, custom_names, interned_names=()):
+    """
+    Return function settling attributes of object_class objects, compiled
+    once for every set of custom fields.
+    """
+    if not Testrail.intern_strings:
+        interned_names = ()
+
+    key = (object_class, Testrail.lazy, Testrail.intern_strings,
+           custom_names, interned_names)
+    try:
+        return _hydrators[key]
+    except KeyError:
+        hydrator = _compile_hydrator(object_class, custom_names,
+                                     interned_names, Testrail.lazy,
+                                     Testrail.intern_strings)
+        _hydrators[key] = hydrator
+        return hydrator
+
+
+def _compile_hydrator(object_class, custom_names, interned_names, lazy,
+                      intern_strings):
+    lines = [
+        'def hydrate(self, a):',
+        '    d = self.__dict__',
+        # object settled before holds values decoded from the old payload
+        '    if d:',
+        '        self._forget_decoded()',
+    ]
+
+    for attribute, key in object_class._system_fields:
+        if intern_strings and attribute in object_class._interned_fields:
+            # raw payload is kept in lazy mode, so it gets shared value too
+            target = 'd[%r] = a[%r]' % (attribute, key) if lazy else \
+                'd[%r]' % attribute
+            lines.append('    %s = share(a[%r])' % (target, key))
+        else:
+            lines.append('    d[%r] = a[%r]' % (attribute, key))
+
+    if lazy:
+        for name in interned_names:
+            lines.append('    a[%r] = share(a[%r])' % (name, name))
+
+        lines.append('    d[\'_attributes\'] = a')
+        lines.append('    d[\'_custom_names\'] = custom_names')
+    else:
+        for attribute, key in object_class._stamp_fields:
+            lines.append('    d[%r] = to_datetime(a[%r])' % (attribute, key))
+
+        for name in custom_names:
+            if name in interned_names:
+                lines.append('    d[%r] = share(a[%r])' % (name, name))
+            else:
+                lines.append('    d[%r] = a[%r]' % (name, name))
+
+    namespace = {
+        'to_datetime': _datetime_from_stamp,
+        'share': _share,
+        'custom_names': frozenset(custom_names),
+    }
+    exec(compile('\n'.join(lines),
+                 '<%s hydrator>' % object_class.__name__,
+                 'exec'),
+         namespace)
+
+    return namespace['hydrate']
+
+
+_row_types = {}
+
+
+def _raw_rows(payloads, fields=None):
+    """
+    Return payloads from server as they are (list of dictionaries) or, if
+    fields are provided, as list of named tuples made of these fields only.
+    """
+    if fields is None:
+        return payloads
+
+    fields = tuple(fields)
+    try:
+        row_type = _row_types[fields]
+    except KeyError:
+        row_type = _row_types[fields] = namedtuple('Row', fields)
+
+    if len(fields) == 1:
+        key = fields[0]
+        return [row_type(p[key]) for p in payloads]
+
+    get = itemgetter(*fields)
+    make = row_type._make
+    return [make(get(p)) for p in payloads]
+
+
+def _parallel_map(function, items, workers):
+    """
+    Call function for every item using up to 'workers' threads.
+    Returns list of results in order of items. If function raised an
+    exception, the first one is re-raised when all items are processed.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+
+    tasks = queue.Queue()
+    for task in enumerate(items):
+        tasks.put(task)
+
+    results = [None] * len(items)
+    errors = []
+
+    def work():
+        while True:
+            try:
+                index, item = tasks.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                results[index] = function(item)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=work)
+               for _ in range(min(workers, len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return results
+
+
+def _eager_load(objects, include, loaders):
+    """
+    Load related objects named in 'include' for all objects at once, so
+    their attributes (test.case, run.suite, ...) are served from the cache.
+
+    :arg loaders: {name: function(objects)} - relations which can be included
+    """
+    if include:
+        unknown = set(include) - set(loaders)
+        if unknown:
+            raise ValueError('Can not include: %s' % ', '.join(sorted(unknown)))
+
+        for name in include:
+            loaders[name](objects)
+
+    return objects
+
+
+def _load_milestones(project, objects):
+    """
+    Load milestones objects are linked to (by milestone_id).
+    """
+    milestone_ids = set(o.milestone_id for o in objects)
+    milestone_ids.discard(None)
+    Testrail._get_objects_by_ids(Milestone, milestone_ids, project.milestones)
+
 
 class _CustomField(object):
     def __init__(self):
@@ -138,10 +551,43 @@ class Testrail(object):
 
     version = (4, 0)
 
+    lazy = False
+
+    intern_strings = False
+    # {value: value} - one shared object for every distinct value
+    strings = {}
+
+    # AsyncReporter (or other writer) taking results of Test.add_result and
+    # Run.add_result_for_case instead of sending them one by one
+    reporter = None
+
+    # service mode settings (see service_mode())
+    metadata_ttl = None
+    max_strings = None
+    # {read-only object class: time it was loaded}
+    _metadata_loaded = {}
+    _metadata_lock = threading.RLock()
+
     def __init__(self,
                  host='', port='80',
                  user='', password='',
-                 compatibility=(4, 0)):
+                 compatibility=(4, 0),
+                 lazy=False,
+                 intern_strings=False):
+        """
+        :arg lazy: if True - Runs, Cases, Tests and Results keep raw data from
+                   server and decode dates and custom fields only when they
+                   are accessed for the first time. Useful for scripts which
+                   load many objects, but read only a few attributes.
+        :arg intern_strings: if True - repeating values of estimates,
+                             versions, elapsed times and dropdown custom
+                             fields are shared by all Cases, Tests and
+                             Results instead of keeping a copy per object.
+                             Saves a lot of memory on big runs and histories.
+
+        :type lazy: bool
+        :type intern_strings: bool
+        """
         Testrail.base_url = 'http://%s:%s/testrail/index.php?api/v2/' % (
             host,
             port
@@ -155,6 +601,11 @@ class Testrail(object):
 
         Testrail.version = compatibility
 
+        Testrail.lazy = lazy
+
+        Testrail.intern_strings = intern_strings
+        Testrail.strings.clear()
+
     ############################################################################
     # Shortcuts to access API by relative path and do common error processing
 
@@ -200,17 +651,100 @@ class Testrail(object):
     #
     # 1. Objects are loaded from server all at once when any of them required.
     # 2. And stay in memory to the end of the script.
-    # 3. No reload attempts will be made
+    # 3. No reload attempts will be made (in service mode - they are loaded
+    #    again after metadata_ttl seconds).
+
+    @staticmethod
+    def _metadata_fresh(object_class):
+        if object_class.cache is None or \
+                object_class not in Testrail._metadata_loaded:
+            return False
+
+        return Testrail.metadata_ttl is None or \
+            time.time() - Testrail._metadata_loaded[object_class] <= \
+            Testrail.metadata_ttl
 
     @staticmethod
     def _get_objects_list(object_class):
 
-        if object_class.cache is not None:
-            return object_class.cache.values()
+        # a copy, as the cache may be replaced or filled by other threads
+        if Testrail._metadata_fresh(object_class):
+            return list(object_class.cache.values())
 
-        else:
-            object_class.cache = {}
-            return object_class.get_all()
+        with Testrail._metadata_lock:
+            if Testrail._metadata_fresh(object_class):
+                # loaded by another thread meanwhile
+                return list(object_class.cache.values())
+
+            if object_class.cache is None:
+                # objects put themselves to the cache when created
+                object_class.cache = {}
+
+            # other threads keep using objects loaded before, until the new
+            # ones are all loaded
+            objects = object_class.get_all()
+            object_class.cache = dict((o.id, o) for o in objects)
+            Testrail._metadata_loaded[object_class] = time.time()
+            return objects
+
+    ############################################################################
+    # Service mode
+
+    @staticmethod
+    def service_mode(ttl=300, max_objects=100000, metadata_ttl=3600,
+                     max_strings=1000000):
+        """
+        Prepare the module for a long-running process: objects are loaded
+        again when they are older than 'ttl' seconds, at most 'max_objects'
+        of every kind (Projects, Runs, Tests, ...) are kept, metadata (users,
+        statuses, custom fields, ...) is loaded again after 'metadata_ttl'
+        seconds.
+
+        :arg ttl: Seconds an object is served from the cache
+        :arg max_objects: Max number of objects of every kind in the cache
+        :arg metadata_ttl: Seconds metadata is served from the cache
+        :arg max_strings: Max number of shared strings (see intern_strings),
+                          new values are not shared when there are so many,
+                          all of them are forgotten when metadata is
+                          reloaded then
+
+        :type ttl: float
+        :type max_objects: int
+        :type metadata_ttl: float
+        :type max_strings: int
+        :rtype: None
+        """
+        Testrail.metadata_ttl = metadata_ttl
+        Testrail.max_strings = max_strings
+
+        for object_class in (Project, Milestone, Suite, Section, Case, Plan,
+                             Run, Test, Result):
+            object_class.cache = _ObjectCache(ttl, max_objects)
+
+        Testrail.refresh_metadata()
+
+    @staticmethod
+    def refresh_metadata():
+        """
+        Mark users, priorities, statuses, case types and custom fields as
+        outdated, so they are loaded again when needed (old ones are served
+        until then). Projects are forgotten, as they keep custom fields
+        applied to them.
+
+        :rtype: None
+        """
+        with Testrail._metadata_lock:
+            # objects loaded before are used until new ones are loaded
+            Testrail._metadata_loaded.clear()
+
+        Project.cache.clear()
+        # custom fields of forgotten projects are not needed any more
+        _field_names.clear()
+
+        if Testrail.max_strings is not None and \
+                len(Testrail.strings) >= Testrail.max_strings:
+            # start sharing values seen from now on
+            Testrail.strings.clear()
 
     @staticmethod
     def _get_object_from_list(object_class,
@@ -439,6 +973,39 @@ class Testrail(object):
         except KeyError:
             return object_class.get_one(object_id)
 
+    @staticmethod
+    def _get_objects_by_ids(object_class, object_ids, listing=None,
+                            workers=8):
+        """
+        Return objects for object_ids (in the same order). Every id missing
+        in the cache is requested only once: all of them are loaded by one
+        listing (function loading list of objects, if provided) and the rest
+        are requested by up to 'workers' parallel requests.
+        """
+        object_ids = list(object_ids)
+        cache = object_class.cache
+
+        # objects are collected here, as the cache may forget some of them
+        # in service mode
+        found = {}
+        missing = []
+        for object_id in object_ids:
+            if object_id not in found:
+                found[object_id] = cache.get(object_id)
+                if found[object_id] is None:
+                    missing.append(object_id)
+
+        if len(missing) > 1 and listing is not None:
+            listing()
+            for object_id in missing:
+                found[object_id] = cache.get(object_id)
+            missing = [i for i in missing if found[i] is None]
+
+        loaded = _parallel_map(object_class.get_one, missing, workers)
+        found.update(zip(missing, loaded))
+
+        return [found[i] for i in object_ids]
+
     ############################################################################
     # Project methods
 
@@ -568,6 +1135,93 @@ class Testrail(object):
         return Testrail._get_object_by_id(Test,
                                           test_id)
 
+    ############################################################################
+    # Batch access by object IDs
+    #
+    # Use these instead of get_*_by_id in a loop: ids are deduplicated, cached
+    # objects are not requested again, missing objects are loaded by one
+    # listing of the parent (if it is provided) or by parallel requests.
+    #
+    #   tests = run.tests()
+    #   cases = Testrail.get_cases_by_ids([t.case_id for t in tests],
+    #                                     suite=run.suite)
+
+    @staticmethod
+    def get_suites_by_ids(suite_ids, project=None, workers=8):
+        """
+        :arg project: Project to list suites of (one request for all)
+        :arg workers: max number of parallel requests
+
+        :type suite_ids: list of [int]
+        :type project: Project
+        :type workers: int
+        :rtype: list of [Suite]
+        """
+        return Testrail._get_objects_by_ids(
+            Suite, suite_ids, project and project.suites, workers
+        )
+
+    @staticmethod
+    def get_sections_by_ids(section_ids, suite=None, workers=8):
+        """
+        :arg suite: Suite to list sections of (one request for all)
+        :arg workers: max number of parallel requests
+
+        :type section_ids: list of [int]
+        :type suite: Suite
+        :type workers: int
+        :rtype: list of [Section]
+        """
+        return Testrail._get_objects_by_ids(
+            Section, section_ids, suite and suite.sections, workers
+        )
+
+    @staticmethod
+    def get_cases_by_ids(case_ids, suite=None, workers=8):
+        """
+        :arg suite: Suite to list cases of (one get_cases for all)
+        :arg workers: max number of parallel requests
+
+        :type case_ids: list of [int]
+        :type suite: Suite
+        :type workers: int
+        :rtype: list of [Case]
+        """
+        return Testrail._get_objects_by_ids(
+            Case, case_ids, suite and suite.cases, workers
+        )
+
+    @staticmethod
+    def get_runs_by_ids(run_ids, project=None, workers=8):
+        """
+        :arg project: Project to list runs of (one get_runs for all, runs of
+                      test plans are requested separately)
+        :arg workers: max number of parallel requests
+
+        :type run_ids: list of [int]
+        :type project: Project
+        :type workers: int
+        :rtype: list of [Run]
+        """
+        return Testrail._get_objects_by_ids(
+            Run, run_ids, project and project.runs, workers
+        )
+
+    @staticmethod
+    def get_tests_by_ids(test_ids, run=None, workers=8):
+        """
+        :arg run: Run to list tests of (one get_tests for all)
+        :arg workers: max number of parallel requests
+
+        :type test_ids: list of [int]
+        :type run: Run
+        :type workers: int
+        :rtype: list of [Test]
+        """
+        return Testrail._get_objects_by_ids(
+            Test, test_ids, run and run.tests, workers
+        )
+
 
 ################################################################################
 # API methods as-is (can be used, but not intended to)
@@ -1594,7 +2248,7 @@ class Project(_TestrailObject):
 
     def plans(self, milestones=None, limit=None, offset=None,
               is_completed=None, created_by=None, created_after=None,
-              created_before=None):
+              created_before=None, where=None):
         """
         Returns list of test plans in the project.
 
@@ -1606,6 +2260,8 @@ class Project(_TestrailObject):
         :arg limit: Limit the result to 'limit' test runs.
         :arg offset: Skip 'offset' records.
         :arg milestones: A comma-separated list of milestone names to filter by.
+        :arg where: Any other conditions (see field()), those the server
+                    can't apply are checked locally (after limit/offset).
 
         :type created_after: datetime.datetime
         :type created_before: datetime.datetime
@@ -1614,48 +2270,56 @@ class Project(_TestrailObject):
         :type limit: int
         :type offset: int
         :type milestones: list of [str]
+        :type where: _Predicate
         :rtype: list of [Plan]
         """
-        data = {
-            'milestone_id': milestones,
-            'limit': limit,
-            'offset': offset,
-            'is_completed': is_completed,
-            'created_by': created_by,
-            'created_after': created_after,
-            'created_before': created_before
-        }
-
-        if milestones is not None:
-            data['milestone_id'] = [
-                str(self.get_milestone_by_name(milestone).id)
-                for milestone in milestones
-            ]
-
-        if created_by is not None:
-            data['created_by'] = [
-                str(Testrail.get_user_by_name(user).id)
-                for user in created_by
-            ]
-
-        if created_after is not None:
-            data['created_after'] = int(time.mktime(
-                created_after.timetuple()
-            ))
+        params, residual = _plan_filter('get_plans', _conditions(
+            None if milestones is None
+            else field('milestone').isin(milestones),
+            None if is_completed is None
+            else field('is_completed') == is_completed,
+            None if created_by is None else field('creator').isin(created_by),
+            None if created_after is None
+            else field('created_on') >= created_after,
+            None if created_before is None
+            else field('created_on') <= created_before,
+            where
+        ), self)
+
+        plans = _filter_rows(
+            TestrailAPI.get_plans(self.id, limit=limit, offset=offset,
+                                  **params),
+            residual
+        )
+        return [Plan(p) for p in plans]
 
-        if created_before is not None:
-            data['created_before'] = int(time.mktime(
-                created_before.timetuple()
-            ))
+    def add_plan(self, name, description='', milestone=None, entries=()):
+        """
+        Creates new test plan with all its entries in one request.
+        Returns newly created plan object.
 
-        return [Plan(p) for p in TestrailAPI.get_plans(self.id, **data)]
+        :arg name: Name of new test plan
+        :arg description: Description of new test plan
+        :arg milestone: Name of the milestone to link plan to
+        :arg entries: arguments of PlanBuilder.add_entry for every entry,
+                      e.g. {'suite': 'Smoke', 'configs': {'Browser':
+                      ['Chrome', 'Firefox'], 'OS': ['Linux', 'Windows']}}
 
-    def add_plan(self):
-        raise NotImplementedError
+        :type name: str
+        :type description: str
+        :type milestone: str
+        :type entries: list of [dict]
+        :rtype: Plan
+        """
+        builder = PlanBuilder(self, name, description, milestone)
+        for entry in entries:
+            builder.add_entry(**entry)
+        return builder.create()
 
     def runs(self, suites=None, milestones=None, limit=None, offset=None,
              is_completed=None, created_by=None, created_after=None,
-             created_before=None):
+             created_before=None, raw=False, fields=None, where=None,
+             workers=1, include=()):
         """
         Returns list of test runs in the project. (Not those which are part
         of a test plan).
@@ -1669,6 +2333,16 @@ class Project(_TestrailObject):
         :arg offset: Skip 'offset' records.
         :arg milestones: A comma-separated list of milestone names to filter by.
         :arg suites: A list of test suite names to filter by.
+        :arg raw: True to return dictionaries from server instead of objects.
+        :arg fields: Names of fields to return as named tuples (implies raw).
+        :arg where: Any other conditions (see field()), those the server
+                    can't apply are checked locally (after limit/offset).
+        :arg workers: if more than 1 - time from created_after (required) to
+                      created_before (or now) is split into windows fetched
+                      concurrently by this number of threads (limit and
+                      offset are not supported then).
+        :arg include: related objects to load with runs (by one request for
+                      all runs): 'suite', 'milestone', 'plan'.
 
         :type created_after: datetime.datetime
         :type created_before: datetime.datetime
@@ -1678,63 +2352,77 @@ class Project(_TestrailObject):
         :type offset: int
         :type milestones: list of [str]
         :type suites: list of [str]
+        :type raw: bool
+        :type fields: list of [str]
+        :type where: _Predicate
+        :type workers: int
+        :type include: list of [str]
         :rtype: list of [Run]
         """
-        data = {
-            'suite_id': suites,
-            'milestone_id': milestones,
-            'limit': limit,
-            'offset': offset,
-            'is_completed': is_completed,
-            'created_by': created_by,
-            'created_after': created_after,
-            'created_before': created_before
+        params, residual = _plan_filter('get_runs', _conditions(
+            None if suites is None else field('suite').isin(suites),
+            None if milestones is None
+            else field('milestone').isin(milestones),
+            None if is_completed is None
+            else field('is_completed') == is_completed,
+            None if created_by is None else field('creator').isin(created_by),
+            None if created_after is None
+            else field('created_on') >= created_after,
+            None if created_before is None
+            else field('created_on') <= created_before,
+            where
+        ), self)
+
+        if workers > 1:
+            if limit is not None or offset is not None:
+                raise ValueError('limit/offset are not supported with workers')
+            if 'created_after' not in params:
+                raise ValueError('created_after is required with workers')
+
+            def fetch(after, before, limit, offset):
+                window = dict(params, created_after=after,
+                              created_before=before)
+                return TestrailAPI.get_runs(self.id, limit=limit,
+                                            offset=offset, **window)
+
+            runs = _windowed_fetch(fetch, params['created_after'],
+                                   params.get('created_before',
+                                              int(time.time())),
+                                   workers)
+        else:
+            runs = TestrailAPI.get_runs(self.id, limit=limit, offset=offset,
+                                        **params)
+
+        runs = _filter_rows(runs, residual)
+
+        if raw or fields is not None:
+            return _raw_rows(runs, fields)
+
+        loaders = {
+            'suite': lambda runs: Testrail.get_suites_by_ids(
+                set(r.suite_id for r in runs), project=self
+            ),
+            'milestone': lambda runs: _load_milestones(self, runs),
+            'plan': lambda runs: Testrail._get_objects_by_ids(
+                Plan, set(r.plan_id for r in runs) - set([None])
+            ),
         }
+        return _eager_load([Run(p) for p in runs], include, loaders)
 
-        if suites is not None:
-            data['suite_id'] = [
-                str(self.get_suite_by_name(suite).id) for suite in suites
-            ]
+    def add_run(self, name, suite, description='',
+                milestone=None, assignedto=None,
+                include_all=True, cases=None):
+        """
+        Creates new test run.
+        Returns newly created run object.
 
-        if milestones is not None:
-            data['milestone_id'] = [
-                str(self.get_milestone_by_name(milestone).id)
-                for milestone in milestones
-            ]
-
-        if created_by is not None:
-            data['created_by'] = [
-                str(Testrail.get_user_by_name(user).id)
-                for user in created_by
-            ]
-
-        if created_after is not None:
-            data['created_after'] = int(time.mktime(
-                created_after.timetuple()
-            ))
-
-        if created_before is not None:
-            data['created_before'] = int(time.mktime(
-                created_before.timetuple()
-            ))
-
-        return [Run(p) for p in TestrailAPI.get_runs(self.id,
-                                                     **data)]
-
-    def add_run(self, name, suite, description='',
-                milestone=None, assignedto=None,
-                include_all=True, cases=None):
-        """
-        Creates new test run.
-        Returns newly created run object.
-
-        :arg name: Name of new test run
-        :arg description: Description of new test run
-        :arg suite: Name of the suite to create tesr run from
-        :arg milestone: Name of the milestone to link run to
-        :arg assignedto: Name of the user to assing run to
-        :arg include_all: if True all cases in suite will be included in run
-        :arg cases: if include_all is False - include only this cases
+        :arg name: Name of new test run
+        :arg description: Description of new test run
+        :arg suite: Name of the suite to create tesr run from
+        :arg milestone: Name of the milestone to link run to
+        :arg assignedto: Name of the user to assing run to
+        :arg include_all: if True all cases in suite will be included in run
+        :arg cases: if include_all is False - include only this cases
 
         :type name: str
         :type description: str
@@ -1742,7 +2430,7 @@ class Project(_TestrailObject):
         :type milestone: str
         :type assignedto: str
         :type include_all: bool
-        :type cases: list of [Cases]
+        :type cases: list of [Cases] or case ids
         :rtype: Run
         """
         data = {
@@ -1761,19 +2449,28 @@ class Project(_TestrailObject):
             data['include_all'] = True
         else:
             data['include_all'] = False
-            data['case_ids'] = [str(c.id) for c in cases]
+            data['case_ids'] = [str(getattr(c, 'id', c)) for c in cases]
 
         return Run(TestrailAPI.add_run(self.id, **data))
 
 
 class ConfigGroup(object):
+    """
+    Configuration group (e.g. Browsers) of a project.
+
+    Attributes:
+       id           -- The unique ID of the configuration group
+       name         -- The name of the configuration group
+       project_id   -- The ID of the project the group belongs to
+       configs      -- dictionary {configuration name: configuration ID}
+    """
     def __init__(self, attributes):
         self.id = attributes['id']
         self.name = attributes['name']
         self.project_id = attributes['project_id']
-        self.configs = {}
-        for k in attributes['configs']:
-            k['id'] = k['name']
+        self.configs = dict(
+            (c['name'], c['id']) for c in attributes['configs']
+        )
 
 
 class Milestone(_TestrailObject):
@@ -1904,8 +2601,13 @@ class Milestone(_TestrailObject):
 
         return [Plan(p) for p in TestrailAPI.get_plans(self.project_id, **data)]
 
-    def add_plan(self):
-        raise NotImplementedError
+    def add_plan(self, name, description='', entries=()):
+        """
+        Creates new test plan linked to this milestone, see Project.add_plan.
+
+        :rtype: Plan
+        """
+        return self.project.add_plan(name, description, self.name, entries)
 
     def runs(self, suites=None, limit=None, offset=None,
              is_completed=None, created_by=None, created_after=None,
@@ -1985,7 +2687,7 @@ class Milestone(_TestrailObject):
         :type suite: str
         :type assignedto: str
         :type include_all: bool
-        :type cases: list of [Cases]
+        :type cases: list of [Cases] or case ids
         :rtype: Run
         """
         data = {
@@ -2002,7 +2704,7 @@ class Milestone(_TestrailObject):
             data['include_all'] = True
         else:
             data['include_all'] = False
-            data['case_ids'] = [str(c.id) for c in cases]
+            data['case_ids'] = [str(getattr(c, 'id', c)) for c in cases]
 
         return Run(TestrailAPI.add_run(self.project_id, **data))
 
@@ -2047,6 +2749,13 @@ class Suite(_TestrailObject):
 
         self._sections = None
         self._root_sections = None
+        self._sections_by_id = None
+        # {(section name, ...): Section}
+        self._section_paths = None
+        # paths of several sections (same name under the same parent)
+        self._ambiguous_paths = None
+
+        self._query = None
 
     @property
     def project(self):
@@ -2101,44 +2810,104 @@ class Suite(_TestrailObject):
             return self._sections
 
     def _build_sections_tree(self):
-        self._root_sections = []
+        self._sections_by_id = by_id = {}
         for s in self._sections:
             s.children = []
+            by_id[s.id] = s
 
+        self._root_sections = []
         for s in self._sections:
             if s.parent_id is None:
                 self._root_sections.append(s)
             else:
-                Testrail.get_section_by_id(s.parent_id).children.append(s)
+                by_id[s.parent_id].children.append(s)
+
+        self._index_paths()
+
+    def _index_paths(self):
+        """
+        Set full path of every section and fill path index, parents first.
+        """
+        self._section_paths = {}
+        self._ambiguous_paths = set()
+
+        stack = [((), s) for s in reversed(self._root_sections)]
+        while stack:
+            parent_path, section = stack.pop()
+            self._add_path(section, parent_path)
+            stack.extend((section.path, child)
+                         for child in reversed(section.children))
+
+    def _add_path(self, section, parent_path):
+        section.path = parent_path + (section.name,)
+        if section.path in self._section_paths:
+            self._ambiguous_paths.add(section.path)
+        # first one wins for sections with same name
+        self._section_paths.setdefault(section.path, section)
+
+    def iter_sections(self, breadth_first=False):
+        """
+        Iterate over all sections of the suite, parents before children:
+        depth-first (same order as in user interface) or level by level.
+
+        :type breadth_first: bool
+        :rtype: iterator of [Section]
+        """
+        if self._sections is None:
+            self.sections()
+
+        if breadth_first:
+            level = list(self._root_sections)
+            while level:
+                for section in level:
+                    yield section
+                level = [child for section in level
+                         for child in section.children]
+        else:
+            stack = list(reversed(self._root_sections))
+            while stack:
+                section = stack.pop()
+                yield section
+                stack.extend(reversed(section.children))
 
     def get_section_by_path(self, *path):
         """
+        Raises ValueError if there are several sections with the path.
+
+        :arg path: Names of sections from the root
+
         :rtype: Section
         """
         if self._sections is None:
             self.sections()
 
-        if len(path) < 1:
-            raise NotFound()
+        if path in self._ambiguous_paths:
+            raise ValueError('Several sections with path: %s' %
+                             ' / '.join(path))
 
-        current_section = None
-        for s in self._root_sections:
-            if s.name == path[0]:
-                current_section = s
+        try:
+            return self._section_paths[path]
+        except KeyError:
+            raise NotFound('No section: %s' % ' / '.join(path))
 
-        if current_section is None:
-            raise NotFound()
+    def section_case_counts(self):
+        """
+        Returns number of cases in every section including its subsections,
+        counted from one get_cases request.
 
-        if len(path) > 1:
-            for item in path[1:]:
-                for s in current_section.children:
-                    if s.name == item:
-                        current_section = s
-                        break
-                else:
-                    raise NotFound()
+        :rtype: dict of {section id: int}
+        """
+        counts = Counter(
+            row.section_id for row in self.cases(fields=['section_id'])
+        )
 
-        return current_section
+        totals = {}
+        sections = list(self.iter_sections(breadth_first=True))
+        for section in reversed(sections):
+            totals[section.id] = counts[section.id] + sum(
+                totals[child.id] for child in section.children
+            )
+        return totals
 
     def add_section(self, name, description='', parent=None):
         """
@@ -2158,10 +2927,26 @@ class Suite(_TestrailObject):
             'name': name,
             'suite_id': self.id,
             'description': description,
-            'parent_id': parent.id,
         }
 
-        return Section(TestrailAPI.add_section(self.project_id, **data))
+        if parent is not None:
+            data['parent_id'] = parent.id
+
+        section = Section(TestrailAPI.add_section(self.project_id, **data))
+
+        # keep loaded sections tree up to date
+        if self._sections is not None:
+            self._sections.append(section)
+            self._sections_by_id[section.id] = section
+            if parent is None:
+                self._root_sections.append(section)
+                self._add_path(section, ())
+            else:
+                parent = self._sections_by_id[parent.id]
+                parent.children.append(section)
+                self._add_path(section, parent.path)
+
+        return section
 
     @property
     def custom_case_fields(self):
@@ -2182,10 +2967,15 @@ class Suite(_TestrailObject):
               created_before=None,
               updated_by=None,
               updated_after=None,
-              updated_before=None):
+              updated_before=None,
+              raw=False,
+              fields=None,
+              where=None,
+              include=()):
         """
         Find and filter cases.
 
+        :arg section: Only return cases of this section
         :arg types: A list of case type names to filter by
         :arg priorities: list of priorities names to filter by
         :arg milestones: list of milestones names to filter by
@@ -2195,7 +2985,15 @@ class Suite(_TestrailObject):
         :arg updated_by: list of user names who updated cases to include
         :arg updated_after: Only return test cases updated after this date
         :arg updated_before: Only return test cases updated before this date
-
+        :arg raw: True to return dictionaries from server instead of objects
+        :arg fields: Names of fields to return as named tuples (implies raw)
+        :arg where: Any other conditions (see field()), those the server
+                    can't apply are checked locally, e.g.
+                    (field('priority') == 'High') & field('refs').matches('X')
+        :arg include: related objects to load with cases (by one request for
+                      all cases): 'section', 'milestone'
+
+        :type section: Section
         :type types: list of [str]
         :type priorities: list os [str]
         :type milestones: list of [str]
@@ -2205,64 +3003,87 @@ class Suite(_TestrailObject):
         :type updated_by: list of [str]
         :type updated_after: datetime.datetime
         :type updated_before: datetime.datetime
+        :type raw: bool
+        :type fields: list of [str]
+        :type where: _Predicate
+        :type include: list of [str]
         :rtype: list of [Case]
         """
-        data = {}
-
-        if types is not None:
-            data['type_id'] = [
-                str(Testrail.get_case_type_by_name(ctype).id)
-                for ctype in types
-            ]
+        params, residual = _plan_filter('get_cases', _conditions(
+            None if section is None else field('section_id') == section.id,
+            None if types is None else field('case_type').isin(types),
+            None if priorities is None
+            else field('priority').isin(priorities),
+            None if milestones is None
+            else field('milestone').isin(milestones),
+            None if created_by is None else field('creator').isin(created_by),
+            None if created_after is None
+            else field('created_on') >= created_after,
+            None if created_before is None
+            else field('created_on') <= created_before,
+            None if updated_by is None else field('updater').isin(updated_by),
+            None if updated_after is None
+            else field('updated_on') >= updated_after,
+            None if updated_before is None
+            else field('updated_on') <= updated_before,
+            where
+        ), self.project)
+
+        cases = _filter_rows(
+            TestrailAPI.get_cases(self.project_id, self.id, **params),
+            residual
+        )
 
-        if priorities is not None:
-            data['priority_id'] = [
-                str(Testrail.get_priority_by_name(priority).id)
-                for priority in priorities
-            ]
+        if raw or fields is not None:
+            return _raw_rows(cases, fields)
 
-        if milestones is not None:
-            data['milestone_id'] = [
-                str(self.project.get_milestone_by_name(milestone).id)
-                for milestone in milestones
-            ]
+        loaders = {
+            'section': lambda cases: Testrail.get_sections_by_ids(
+                set(c.section_id for c in cases), suite=self
+            ),
+            'milestone': lambda cases: _load_milestones(self.project, cases),
+        }
+        return _eager_load(Case._build_many(cases, self.custom_case_fields),
+                           include, loaders)
 
-        if created_by is not None:
-            data['created_by'] = [
-                str(Testrail.get_user_by_name(user).id)
-                for user in created_by
-            ]
+    def query(self, refresh=False):
+        """
+        Returns all cases of the suite as Collection for local queries:
 
-        if created_after is not None:
-            data['created_after'] = int(time.mktime(
-                created_after.timetuple()
-            ))
+            cases = suite.query()
+            cases.select((field('custom_area') == 2) &
+                         field('title').matches('login'))
 
-        if created_before is not None:
-            data['created_before'] = int(time.mktime(
-                created_before.timetuple()
-            ))
+        Cases are loaded once and kept until refresh is requested.
 
-        if updated_by is not None:
-            data['updated_by'] = [
-                str(Testrail.get_user_by_name(user).id)
-                for user in updated_by
-            ]
+        :arg refresh: if True - load cases again
+        :type refresh: bool
+        :rtype: Collection
+        """
+        if refresh or self._query is None:
+            self._query = Collection(self.cases())
+        return self._query
 
-        if updated_after is not None:
-            data['updated_after'] = int(time.mktime(
-                updated_after.timetuple()
-            ))
+    def sync(self, tree, delete=False, workers=4, rate=None, progress=None):
+        """
+        Make sections and cases of the suite match the tree, with as few
+        requests as possible. See SuiteSync for tree format.
 
-        if updated_before is not None:
-            data['updated_before'] = int(time.mktime(
-                updated_before.timetuple()
-            ))
+        :arg tree: Desired sections and cases
+        :arg delete: if True - sections and cases missing in the tree are
+                     deleted, otherwise they stay
+        :arg workers: Number of threads sending requests
+        :arg rate: Max number of requests per second, None - no limit
+        :arg progress: function(done, total) called after every case written
 
-        return [Case(c) for c in TestrailAPI.get_cases(self.project_id,
-                                                       self.id,
-                                                       section.id,
-                                                       **data)]
+        :type tree: dict
+        :type delete: bool
+        :type workers: int
+        :type rate: float
+        :type progress: callable
+        :rtype: (SyncPlan, list of [(SyncPlan field, target, exception)])
+        """
+        return SuiteSync(self, tree, delete, workers, rate, progress).apply()
 
     def add_run(self, name, description='', milestone=None,
                 assignedto=None, include_all=None, cases=None):
@@ -2282,7 +3103,7 @@ class Suite(_TestrailObject):
         :type milestone: str
         :type assignedto: str
         :type include_all: bool
-        :type cases: list of [Cases]
+        :type cases: list of [Cases] or case ids
         :rtype: Run
         """
         data = {
@@ -2301,7 +3122,7 @@ class Suite(_TestrailObject):
             data['include_all'] = True
         else:
             data['include_all'] = False
-            data['case_ids'] = [str(c.id) for c in cases]
+            data['case_ids'] = [str(getattr(c, 'id', c)) for c in cases]
 
         return Run(TestrailAPI.add_run(self.project_id, **data))
 
@@ -2402,8 +3223,32 @@ class Plan(_TestrailObject):
                 result.append(r)
         return result
 
-    def add_entry(self):
-        raise NotImplementedError
+    def router(self, size=100, workers=4, journal=None):
+        """
+        Returns router sending results to runs of this plan by configuration,
+        see PlanRouter.
+
+        :rtype: PlanRouter
+        """
+        return PlanRouter(self, size, workers, journal)
+
+    def add_entry(self, suite, configs=None, name=None, description=None,
+                  assignedto=None, include_all=True, cases=None):
+        """
+        Adds entry to the plan: one run per combination of configurations,
+        created with one request. Arguments are same as of
+        PlanBuilder.add_entry.
+        Returns entry as provided by server.
+
+        :rtype: dict
+        """
+        builder = PlanBuilder(self.project, self.name)
+        builder.add_entry(suite, configs, name, description, assignedto,
+                          include_all, cases)
+
+        entry = TestrailAPI.add_plan_entry(self.id, **builder.entries[0])
+        self.entries.append(entry)
+        return entry
 
     def update_entry(self):
         raise NotImplementedError
@@ -2457,6 +3302,15 @@ class Run(_TestrailObject):
 
     cache = {}
 
+    _stamp_fields = (
+        ('created_on', 'created_on'),
+        ('completed_on', 'completed_on'),
+    )
+
+    _lazy_attributes = dict(
+        (name, _stamp_decoder(key)) for name, key in _stamp_fields
+    )
+
     def _settle_attributes(self, attributes):
         self.id = attributes['id']
         self.name = attributes['name']
@@ -2475,12 +3329,13 @@ class Run(_TestrailObject):
         self.is_completed = attributes['is_completed']
         self.completed_on_stamp = attributes['completed_on']
 
-        self.created_on = datetime.datetime.fromtimestamp(float(attributes['created_on']))
-
-        try:
-            self.completed_on = datetime.datetime.fromtimestamp(float(attributes['completed_on']))
-        except TypeError:
-            self.completed_on = None
+        if Testrail.lazy:
+            self._defer_attributes(attributes)
+        else:
+            self.created_on = _datetime_from_stamp(attributes['created_on'])
+            self.completed_on = _datetime_from_stamp(
+                attributes['completed_on']
+            )
 
         self.passed_count = attributes['passed_count']
         self.failed_count = attributes['failed_count']
@@ -2528,13 +3383,23 @@ class Run(_TestrailObject):
     def get_one(run_id):
         return Run(TestrailAPI.get_run(run_id))
 
-    def tests(self, statuses=None):
+    def tests(self, statuses=None, raw=False, fields=None, columnar=False,
+              include=()):
         """
         Return list of tests in this test run
 
         :arg statuses: List of statuses names to include
+        :arg raw: True to return dictionaries from server instead of objects
+        :arg fields: Names of fields to return as named tuples (implies raw)
+        :arg columnar: True to return Table instead of list of objects
+        :arg include: related objects to load with tests (by one request for
+                      all tests): 'case', 'latest_result', 'milestone'
 
         :type statuses: list of [str]
+        :type raw: bool
+        :type fields: list of [str]
+        :type columnar: bool
+        :type include: list of [str]
         :rtype: list of [Test]
         """
         data = {}
@@ -2544,7 +3409,61 @@ class Run(_TestrailObject):
                 for s in statuses
             ]
 
-        return [Test(t) for t in TestrailAPI.get_tests(self.id, **data)]
+        tests = TestrailAPI.get_tests(self.id, **data)
+
+        if columnar:
+            return Table.from_payloads(tests, Table.TEST_COLUMNS)
+
+        if raw or fields is not None:
+            return _raw_rows(tests, fields)
+
+        loaders = {
+            'case': lambda tests: Testrail.get_cases_by_ids(
+                set(t.case_id for t in tests), suite=self.suite
+            ),
+            'latest_result': self._load_latest_results,
+            'milestone': lambda tests: _load_milestones(self.project, tests),
+        }
+        return _eager_load(Test._build_many(tests, self.custom_case_fields),
+                           include, loaders)
+
+    def _load_latest_results(self, tests):
+        """
+        Set latest results of tests from one get_results_for_run.
+        """
+        latest = {}
+        for result in TestrailAPI.get_results_for_run(self.id):
+            known = latest.get(result['test_id'])
+            if known is None or (known['created_on'], known['id']) < \
+                    (result['created_on'], result['id']):
+                latest[result['test_id']] = result
+
+        results = dict(
+            (r.test_id, r) for r in
+            Result._build_many(list(latest.values()),
+                               self.custom_result_fields)
+        )
+        for test in tests:
+            test._latest_result = results.get(test.id)
+
+    def index(self):
+        """
+        Returns RunIndex of this run: tests by case, latest results by test
+        and tests by status, which can be refreshed with new results only.
+
+        :rtype: RunIndex
+        """
+        return RunIndex(self)
+
+    def watch(self, interval=10.0):
+        """
+        Returns RunWatcher following progress of this run.
+
+        :arg interval: Number of seconds between polls in background
+        :type interval: float
+        :rtype: RunWatcher
+        """
+        return RunWatcher(self, interval)
 
     @property
     def custom_result_fields(self):
@@ -2570,7 +3489,12 @@ class Run(_TestrailObject):
                 offset=None,
                 created_by=None,
                 created_after=None,
-                created_before=None):
+                created_before=None,
+                raw=False,
+                fields=None,
+                columnar=False,
+                where=None,
+                workers=1):
         """
         Get results in this run.
 
@@ -2580,6 +3504,15 @@ class Run(_TestrailObject):
         :arg created_by: list of user names who added results to include
         :arg created_after: Only return results created after this date
         :arg created_before: Only return results created before this date
+        :arg raw: True to return dictionaries from server instead of objects
+        :arg fields: Names of fields to return as named tuples (implies raw)
+        :arg columnar: True to return Table instead of list of objects
+        :arg where: Any other conditions (see field()), those the server
+                    can't apply are checked locally (after limit/offset)
+        :arg workers: if more than 1 - time from created_after (or creation
+                      of the run) to created_before (or now) is split into
+                      windows fetched concurrently by this number of threads
+                      (limit and offset are not supported then)
 
         :type statuses: list of [str]
         :type limit: int
@@ -2587,37 +3520,53 @@ class Run(_TestrailObject):
         :type created_by: list
         :type created_after: datetime.datetime
         :type created_before: datetime.datetime
+        :type raw: bool
+        :type fields: list of [str]
+        :type columnar: bool
+        :type where: _Predicate
+        :type workers: int
         :rtype: list of [Result]
         """
-        data = {
-            'limit': limit,
-            'offset': offset,
-        }
-
-        if statuses is not None:
-            data['status_id'] = [
-                str(Testrail.get_status_by_name(s).id)
-                for s in statuses
-            ]
+        params, residual = _plan_filter('get_results_for_run', _conditions(
+            None if statuses is None else field('status').isin(statuses),
+            None if created_by is None else field('creator').isin(created_by),
+            None if created_after is None
+            else field('created_on') >= created_after,
+            None if created_before is None
+            else field('created_on') <= created_before,
+            where
+        ), self.project)
+
+        if workers > 1:
+            if limit is not None or offset is not None:
+                raise ValueError('limit/offset are not supported with workers')
+
+            def fetch(after, before, limit, offset):
+                window = dict(params, created_after=after,
+                              created_before=before)
+                return TestrailAPI.get_results_for_run(self.id, limit=limit,
+                                                       offset=offset,
+                                                       **window)
+
+            results = _windowed_fetch(
+                fetch,
+                params.get('created_after', self.created_on_stamp),
+                params.get('created_before', int(time.time())),
+                workers
+            )
+        else:
+            results = TestrailAPI.get_results_for_run(self.id, limit=limit,
+                                                      offset=offset, **params)
 
-        if created_by is not None:
-            data['status_id'] = [
-                str(Testrail.get_user_by_name(u).id)
-                for u in created_by
-            ]
+        results = _filter_rows(results, residual)
 
-        if created_after is not None:
-            data['created_after'] = int(time.mktime(
-                created_after.timetuple()
-            ))
+        if columnar:
+            return Table.from_payloads(results, Table.RESULT_COLUMNS)
 
-        if created_before is not None:
-            data['created_before'] = int(time.mktime(
-                created_before.timetuple()
-            ))
+        if raw or fields is not None:
+            return _raw_rows(results, fields)
 
-        return [Result(r) for r in TestrailAPI.get_results_for_run(self.id,
-                                                                   **data)]
+        return Result._build_many(results, self.custom_result_fields)
 
     def results_for_case(self,
                          case,
@@ -2649,9 +3598,10 @@ class Run(_TestrailObject):
                 for s in statuses
             ]
 
-        return [Result(r) for r in TestrailAPI.get_results_for_case(self.id,
-                                                                    case.id,
-                                                                    **data)]
+        return Result._build_many(TestrailAPI.get_results_for_case(self.id,
+                                                                   case.id,
+                                                                   **data),
+                                  self.custom_result_fields)
 
     def add_result_for_case(self,
                             case,
@@ -2661,24 +3611,73 @@ class Run(_TestrailObject):
                             elapsed=None,
                             defects=None,
                             assignedto=None):
-        data = {
-            'status_id': Testrail.get_status_by_name(status_name).id,
-            'comment': comment
-        }
+        data = _result_data(status_name, comment, version, elapsed, defects,
+                            assignedto)
 
-        if version is not None:
-            data['version'] = version
+        if Testrail.reporter is not None:
+            data['case_id'] = case.id
+            Testrail.reporter.submit(self, data)
+            return None
 
-        if elapsed is not None:
-            data['elapsed'] = elapsed
+        return Result(TestrailAPI.add_result_for_case(self.id, case.id, **data))
 
-        if defects is not None:
-            data['defects'] = defects
+    def add_results(self, results, size=100, workers=1, journal=None):
+        """
+        Add many results with few requests.
+
+        :arg results: Result fields (see TestrailAPI.add_result), each with
+                      'test_id' or 'case_id'
+        :arg size: Max number of results sent with one request
+        :arg workers: Number of parallel requests
+        :arg journal: Journal making the upload resumable: results stored by
+                      previous uploads with the same journal are skipped
+
+        :type results: list of [dict]
+        :type size: int
+        :type workers: int
+        :type journal: UploadJournal
+        :rtype: (list of [Result], list of [(dict, Exception)]) - created
+                results and rejected result fields with errors
+        """
+        chunks = []
+        for key, send in (('test_id', TestrailAPI.add_results),
+                          ('case_id', TestrailAPI.add_results_for_cases)):
+            items = [r for r in results if key in r]
+            for start in range(0, len(items), size):
+                chunks.append((items[start:start + size], send))
+
+        outcomes = _parallel_map(
+            lambda chunk: _upload_results(self, chunk[0], chunk[1], journal),
+            chunks,
+            workers
+        )
 
-        if assignedto is not None:
-            data['assignedto_id'] = Testrail.get_user_by_name(assignedto).id
+        created = [result for sent, failed in outcomes
+                   for item, result in sent]
+        errors = [error for sent, failed in outcomes for error in failed]
+        return created, errors
 
-        return Result(TestrailAPI.add_result_for_case(self.id, case.id, **data))
+    def batch(self, size=100, interval=None, journal=None):
+        """
+        Returns a writer which collects results for this run and sends them
+        in chunks, one request per chunk. Use it as a context manager to send
+        the rest of results on exit:
+
+            with run.batch(size=200) as batch:
+                for test in run.tests():
+                    batch.set_passed(test, comment='OK')
+
+        :arg size: Max number of results sent with one request
+        :arg interval: Max number of seconds to hold collected results
+        :arg journal: Journal to skip results stored by previous uploads
+
+        :type size: int
+        :type interval: float
+        :type journal: UploadJournal
+        :rtype: ResultBatch
+        """
+        return ResultBatch(self, size=size, interval=interval,
+                           journal=journal)
 
 
 class Section(_TestrailObject):
@@ -2688,6 +3687,9 @@ class Section(_TestrailObject):
     Module Attributes:
        parent           -- Link to parent Section object
        suite            -- Link to Suite object this section belongs to
+       children         -- List of subsections
+       path             -- Tuple of section names from the root (set when
+                           sections of the suite are loaded)
 
     Testrail Attributes:
        id               -- The unique ID of the section
@@ -2712,6 +3714,7 @@ class Section(_TestrailObject):
         self.depth = attributes['depth']
 
         self.children = []
+        self.path = None
 
     @property
     def parent(self):
@@ -2731,7 +3734,22 @@ class Section(_TestrailObject):
 
         :rtype: None
         """
-        raise NotImplementedError
+        data = {}
+
+        if name is not None:
+            data['name'] = name
+
+        if description is not None:
+            data['description'] = description
+
+        children, path = self.children, self.path
+        self._settle_attributes(TestrailAPI.update_section(self.id, **data))
+        self.children, self.path = children, path
+
+        # paths of the section and its subsections are changed
+        suite = Testrail.get_suite_by_id(self.suite_id)
+        if name is not None and suite._sections is not None:
+            suite._index_paths()
 
     def delete(self):
         """
@@ -2741,7 +3759,23 @@ class Section(_TestrailObject):
         test cases as well as active tests & results, i.e. tests & results
         that weren't closed (archived) yet.
         """
-        raise NotImplementedError
+        TestrailAPI.delete_section(self.id)
+
+        # remove the section with subsections from loaded sections tree
+        suite = Testrail.get_suite_by_id(self.suite_id)
+        if suite._sections is not None:
+            removed = set()
+            stack = [suite._sections_by_id.get(self.id, self)]
+            while stack:
+                section = stack.pop()
+                removed.add(section.id)
+                stack.extend(section.children)
+
+            suite._sections = [s for s in suite._sections
+                               if s.id not in removed]
+            suite._build_sections_tree()
+
+        self._settle_attributes(defaultdict(lambda: None))
 
     def add_subsection(self, name, description=''):
         """
@@ -2750,21 +3784,12 @@ class Section(_TestrailObject):
 
         :arg name: Name of new section
         :arg description: Description of new section
-        :arg parent: Parent section object (if any)
 
         :type name: str
         :type description: str
-        :type parent: Section
         :rtype: Section
         """
-        data = {
-            'name': name,
-            'suite_id': self.suite_id,
-            'description': description,
-            'parent_id': self.id,
-        }
-
-        return Section(TestrailAPI.add_section(self.suite.project_id, **data))
+        return self.suite.add_section(name, description, parent=self)
 
     def cases(self,
               include_subsections=False,
@@ -2802,76 +3827,66 @@ class Section(_TestrailObject):
         :type updated_after: datetime.datetime
         :type updated_before: datetime.datetime
         """
-        data = {}
-
-        if types is not None:
-            data['type_id'] = [
-                str(Testrail.get_case_type_by_name(t).id) for t in types
-            ]
-
-        if priorities is not None:
-            data['priority_id'] = [
-                str(Testrail.get_priority_by_name(p).id) for p in priorities
-            ]
-
-        if milestones is not None:
-            data['milestone_id'] = [
-                str(self.suite.project.get_milestone_by_name(m).id) for m in milestones
-            ]
-
-        if created_by is not None:
-            data['created_by'] = [
-                str(Testrail.get_user_by_name(u).id) for u in created_by
-            ]
-
-        if created_after is not None:
-            data['created_after'] = int(time.mktime(
-                created_after.timetuple()
-            ))
-
-        if created_before is not None:
-            data['created_before'] = int(time.mktime(
-                created_before.timetuple()
-            ))
-
-        if updated_by is not None:
-            data['updated_by'] = [
-                str(Testrail.get_user_by_name(user).id)
-                for user in updated_by
-            ]
-
-        if updated_after is not None:
-            data['updated_after'] = int(time.mktime(
-                updated_after.timetuple()
-            ))
-
-        if updated_before is not None:
-            data['updated_before'] = int(time.mktime(
-                updated_before.timetuple()
-            ))
+        suite = self.suite
 
         if not include_subsections:
-            return [Case(c) for c in TestrailAPI.get_cases(self.suite.project_id,
-                                                           self.suite_id,
-                                                           self.id,
-                                                           **data)]
-        else:
-            result = [
-                Case(c) for c in TestrailAPI.get_cases(self.suite.project_id,
-                                                       self.suite_id,
-                                                       self.id,
-                                                       **data)
-            ]
-            for sec in self.children:
-                result.extend(
-                    sec.cases(True, types, priorities, milestones, created_by,
-                              created_after, created_before, updated_by,
-                              updated_after, updated_before)
-                )
-            return result
+            return suite.cases(self, types, priorities, milestones,
+                               created_by, created_after, created_before,
+                               updated_by, updated_after, updated_before)
+
+        # One request for cases of the whole suite, the subtree is selected
+        # locally by sections tree.
+        subtree = self._subtree_ids(suite.sections())
+        return suite.cases(None, types, priorities, milestones, created_by,
+                           created_after, created_before, updated_by,
+                           updated_after, updated_before,
+                           where=field('section_id').isin(subtree))
+
+    def _subtree_ids(self, sections):
+        """
+        Returns set of ids of this section and all its subsections.
+
+        :arg sections: all sections of the suite
+        """
+        children = defaultdict(list)
+        for section in sections:
+            children[section.parent_id].append(section.id)
+
+        subtree = set()
+        stack = [self.id]
+        while stack:
+            section_id = stack.pop()
+            subtree.add(section_id)
+            stack.extend(children[section_id])
+        return subtree
+
+    def add_case(self, title, case_type=None, priority=None, milestone=None,
+                 estimate=None, refs=None, **custom_fields):
+        """
+        Creates new test case in this section.
+        Returns newly created case object.
+        Custom case fields can be passed by system name (custom_...).
+
+        :arg title: Title of new test case
+        :arg case_type: Name of the case type
+        :arg priority: Name (short) of the priority
+        :arg milestone: Name of the milestone to link case to
+        :arg estimate: The estimate, e.g. "30s" or "1m 45s"
+        :arg refs: A comma-separated list of references/requirements
+
+        :type title: str
+        :type case_type: str
+        :type priority: str
+        :type milestone: str
+        :type estimate: str
+        :type refs: str
+        :rtype: Case
+        """
+        data = _case_data(self.suite.project, title, case_type, priority,
+                          milestone, estimate, refs)
+        data.update(custom_fields)
 
-    def add_case(self):
-        raise NotImplementedError
+        return Case(TestrailAPI.add_case(self.id, **data))
 
 
 class Case(_TestrailObject):
@@ -2913,33 +3928,46 @@ class Case(_TestrailObject):
     """
     cache = {}
 
-    def _settle_attributes(self, attributes):
-        self.id = attributes['id']
-        self.suite_id = attributes['suite_id']
-        self.section_id = attributes['section_id']
-
-        self.title = attributes['title']
-        self.type_id = attributes['type_id']
-        self.priority_id = attributes['priority_id']
-        self.milestone_id = attributes['milestone_id']
+    _system_fields = (
+        ('id', 'id'),
+        ('suite_id', 'suite_id'),
+        ('section_id', 'section_id'),
+        ('title', 'title'),
+        ('type_id', 'type_id'),
+        ('priority_id', 'priority_id'),
+        ('milestone_id', 'milestone_id'),
+        ('refs', 'refs'),
+        ('estimate', 'estimate'),
+        ('estimate_forecast', 'estimate_forecast'),
+        ('created_on_stamp', 'created_on'),
+        ('created_by_id', 'created_by'),
+        ('updated_on_stamp', 'updated_on'),
+        ('updated_by_id', 'updated_by'),
+    )
+
+    _stamp_fields = (
+        ('created_on', 'created_on'),
+        ('updated_on', 'updated_on'),
+    )
+
+    _interned_fields = ('estimate', 'estimate_forecast')
+
+    _lazy_attributes = dict(
+        (name, _stamp_decoder(key)) for name, key in _stamp_fields
+    )
 
-        self.refs = attributes['refs']
-        self.estimate = attributes['estimate']
-        self.estimate_forecast = attributes['estimate_forecast']
+    def _settle_attributes(self, attributes):
+        self._hydrate(attributes)
 
-        self.created_on_stamp = attributes['created_on']
-        self.created_on = datetime.datetime.fromtimestamp(float(attributes['created_on']))
-        self.created_by_id = attributes['created_by']
-        self.updated_on_stamp = attributes['updated_on']
-        try:
-            self.updated_on = datetime.datetime.fromtimestamp(float(attributes['updated_on']))
-        except TypeError:
-            self.updated_on = None
-        self.updated_by_id = attributes['updated_by']
+    @staticmethod
+    def _custom_fields(attributes):
+        if attributes['suite_id'] is None:
+            # deleted case
+            return ()
 
-        # and all the custom fields:
-        for custom in self.suite.custom_case_fields:
-            setattr(self, custom.system_name, attributes[custom.system_name])
+        return Testrail.get_suite_by_id(
+            attributes['suite_id']
+        ).custom_case_fields
 
     @property
     def suite(self):
@@ -2973,11 +4001,30 @@ class Case(_TestrailObject):
     def get_one(case_id):
         return Case(TestrailAPI.get_case(case_id))
 
-    def update(self):
-        raise NotImplementedError
+    def update(self, title=None, case_type=None, priority=None,
+               milestone=None, estimate=None, refs=None, **custom_fields):
+        """
+        Change test case fields, custom case fields can be passed by system
+        name (custom_...).
+
+        :rtype: None
+        """
+        data = _case_data(self.suite.project, title, case_type, priority,
+                          milestone, estimate, refs)
+        data.update(custom_fields)
+
+        self._settle_attributes(TestrailAPI.update_case(self.id, **data))
 
     def delete(self):
-        raise NotImplementedError
+        """
+        Delete test case.
+
+        !!! Deleting a test case cannot be undone and also permanently deletes
+        all test results in active test runs (i.e. test runs that haven't been
+        closed (archived) yet).
+        """
+        TestrailAPI.delete_case(self.id)
+        self._settle_attributes(defaultdict(lambda: None))
 
     def results_in_run(self,
                        run,
@@ -3008,9 +4055,10 @@ class Case(_TestrailObject):
                 str(Testrail.get_status_by_name(s).id) for s in statuses
             ]
 
-        return [Result(r) for r in TestrailAPI.get_results_for_case(run.id,
-                                                                    self.id,
-                                                                    **data)]
+        return Result._build_many(TestrailAPI.get_results_for_case(run.id,
+                                                                   self.id,
+                                                                   **data),
+                                  run.custom_result_fields)
 
     def add_result_in_run(self,
                           run,
@@ -3054,29 +4102,37 @@ class Test(_TestrailObject):
        priority     -- Priority object of the test
        milestone    -- Milestone object the test is linked to
        assignedto   -- User object the test is assigned to
+       latest_result -- the latest Result of the test (None if there are no
+                        results)
     """
 
     cache = {}
 
+    _system_fields = (
+        ('id', 'id'),
+        ('run_id', 'run_id'),
+        ('case_id', 'case_id'),
+        ('status_id', 'status_id'),
+        ('title', 'title'),
+        ('type_id', 'type_id'),
+        ('priority_id', 'priority_id'),
+        ('milestone_id', 'milestone_id'),
+        ('refs', 'refs'),
+        ('estimate', 'estimate'),
+        ('estimate_forecast', 'estimate_forecast'),
+        ('assignedto_id', 'assignedto_id'),
+    )
+
+    _interned_fields = ('estimate', 'estimate_forecast')
+
     def _settle_attributes(self, attributes):
-        self.id = attributes['id']
-        self.run_id = attributes['run_id']
-        self.case_id = attributes['case_id']
-        self.status_id = attributes['status_id']
-        self.title = attributes['title']
-        self.type_id = attributes['type_id']
-        self.priority_id = attributes['priority_id']
+        self._hydrate(attributes)
 
-        self.milestone_id = attributes['milestone_id']
-        self.refs = attributes['refs']
-        self.estimate = attributes['estimate']
-        self.estimate_forecast = attributes['estimate_forecast']
-
-        self.assignedto_id = attributes['assignedto_id']
-
-        # and all the custom fields:
-        for custom in self.run.custom_case_fields:
-            setattr(self, custom.system_name, attributes[custom.system_name])
+    @staticmethod
+    def _custom_fields(attributes):
+        return Testrail.get_run_by_id(
+            attributes['run_id']
+        ).custom_case_fields
 
     @property
     def run(self):
@@ -3109,6 +4165,13 @@ class Test(_TestrailObject):
         except NotFound:
             return 'Unassigned'
 
+    @property
+    def latest_result(self):
+        if '_latest_result' not in self.__dict__:
+            results = self.results(limit=1)
+            self._latest_result = results[0] if results else None
+        return self._latest_result
+
     @staticmethod
     def get_one(test_id):
         return Test(TestrailAPI.get_test(test_id))
@@ -3120,25 +4183,13 @@ class Test(_TestrailObject):
                    elapsed=None,
                    defects=None,
                    assignedto=None):
-        data = {}
-
-        if status_name is not None:
-            data['status_id'] = Testrail.get_status_by_name(status_name).id
-
-        if comment is not None:
-            data['comment'] = comment
-
-        if version is not None:
-            data['version'] = version
+        data = _result_data(status_name, comment, version, elapsed, defects,
+                            assignedto)
 
-        if elapsed is not None:
-            data['elapsed'] = elapsed
-
-        if defects is not None:
-            data['defects'] = defects
-
-        if assignedto is not None:
-            data['assignedto_id'] = Testrail.get_user_by_name(assignedto).id
+        if Testrail.reporter is not None:
+            data['test_id'] = self.id
+            Testrail.reporter.submit(self.run, data)
+            return None
 
         return Result(TestrailAPI.add_result(self.id, **data))
 
@@ -3227,7 +4278,8 @@ class Test(_TestrailObject):
                 for s in statuses
             ]
 
-        return [Result(r) for r in TestrailAPI.get_results(self.id, **data)]
+        return Result._build_many(TestrailAPI.get_results(self.id, **data),
+                                  self.run.custom_result_fields)
 
 
 class Result(_TestrailObject):
@@ -3258,22 +4310,37 @@ class Result(_TestrailObject):
 
     cache = {}
 
+    _system_fields = (
+        ('id', 'id'),
+        ('test_id', 'test_id'),
+        ('status_id', 'status_id'),
+        ('version', 'version'),
+        ('created_on_stamp', 'created_on'),
+        ('created_by_id', 'created_by'),
+        ('assignedto_id', 'assignedto_id'),
+        ('comment', 'comment'),
+        ('elapsed', 'elapsed'),
+        ('defects', 'defects'),
+    )
+
+    _stamp_fields = (
+        ('created_on', 'created_on'),
+    )
+
+    _interned_fields = ('version', 'elapsed')
+
+    _lazy_attributes = dict(
+        (name, _stamp_decoder(key)) for name, key in _stamp_fields
+    )
+
     def _settle_attributes(self, attributes):
-        self.id = attributes['id']
-        self.test_id = attributes['test_id']
-        self.status_id = attributes['status_id']
-        self.version = attributes['version']
-        self.created_on_stamp = attributes['created_on']
-        self.created_on = datetime.datetime.fromtimestamp(float(attributes['created_on']))
-        self.created_by_id = attributes['created_by']
-        self.assignedto_id = attributes['assignedto_id']
-        self.comment = attributes['comment']
-        self.elapsed = attributes['elapsed']
-        self.defects = attributes['defects']
+        self._hydrate(attributes)
 
-        # and all the custom fields:
-        for custom in self.test.run.custom_result_fields:
-            setattr(self, custom.system_name, attributes[custom.system_name])
+    @staticmethod
+    def _custom_fields(attributes):
+        return Testrail.get_test_by_id(
+            attributes['test_id']
+        ).run.custom_result_fields
 
     @property
     def test(self):
@@ -3289,4 +4356,3014 @@ class Result(_TestrailObject):
 
     @property
     def created_by(self):
-        return Testrail.get_user_by_id(self.created_by_id)
\ No newline at end of file
+        return Testrail.get_user_by_id(self.created_by_id)
+
+################################################################################
+# Bulk Result Writers
+################################################################################
+def _result_data(status_name=None, comment=None, version=None, elapsed=None,
+                 defects=None, assignedto=None):
+    """
+    Build POST fields of a result from human-readable arguments.
+    """
+    data = {}
+
+    if status_name is not None:
+        data['status_id'] = Testrail.get_status_by_name(status_name).id
+
+    if comment is not None:
+        data['comment'] = comment
+
+    if version is not None:
+        data['version'] = version
+
+    if elapsed is not None:
+        data['elapsed'] = elapsed
+
+    if defects is not None:
+        data['defects'] = defects
+
+    if assignedto is not None:
+        data['assignedto_id'] = Testrail.get_user_by_name(assignedto).id
+
+    return data
+
+
+def _send_results(run, items, send):
+    """
+    Send results with one request (send is TestrailAPI.add_results or
+    TestrailAPI.add_results_for_cases). If the server rejects the request as
+    bad (some item is invalid), failed items are found by splitting items in
+    halves. When access is denied or the server fails (or throttles
+    requests), the whole chunk fails without more requests.
+
+    Returns (list of (item, Result), list of (item, exception)).
+    """
+    if not items:
+        return [], []
+
+    try:
+        payloads = send(run.id, results=items)
+        if not isinstance(payloads, list):
+            raise ServerError('Unexpected response on %s results' % len(items))
+
+    except (AccessDenied, ServerError) as e:
+        return [], [(item, e) for item in items]
+
+    except NotFound as e:
+        if len(items) == 1:
+            return [], [(items[0], e)]
+
+        middle = len(items) // 2
+        sent_head, failed_head = _send_results(run, items[:middle], send)
+        sent_tail, failed_tail = _send_results(run, items[middle:], send)
+        return sent_head + sent_tail, failed_head + failed_tail
+
+    results = Result._build_many(payloads, run.custom_result_fields)
+    return list(zip(items, results)), []
+
+
+def _upload_results(run, items, send, journal=None):
+    """
+    Same as _send_results, but if journal (UploadJournal) is provided, items
+    stored by previous uploads are skipped and stored items are recorded.
+    """
+    if journal is None:
+        return _send_results(run, items, send)
+
+    pending = journal.pending(run, items)
+    if not pending:
+        return [], []
+
+    chunk = journal.begin(run, [key for key, item in pending])
+
+    keys = dict((id(item), key) for key, item in pending)
+    sent, failed = _send_results(run, [item for key, item in pending], send)
+
+    journal.commit(chunk, [keys[id(item)] for item, result in sent])
+    return sent, failed
+
+
+def _append_records(path, records, sync=False):
+    """
+    Append records to a file of JSON lines (created if missing).
+    """
+    with open(path, 'ab+') as journal:
+        journal.seek(0, os.SEEK_END)
+        if journal.tell():
+            journal.seek(-1, os.SEEK_END)
+            if journal.read(1) != b'\n':
+                # last line was cut by crash while writing, so it is ended
+                # before the next record instead of swallowing it
+                journal.write(b'\n')
+
+        journal.write(''.join(
+            json.dumps(record) + '\n' for record in records
+        ).encode('utf-8'))
+        journal.flush()
+        if sync:
+            os.fsync(journal.fileno())
+
+
+class UploadJournal(object):
+    """
+    Write-ahead journal of bulk result uploads, which makes them idempotent
+    and resumable.
+
+    Every result is identified by (run, test or case, hash of its fields).
+    Before a chunk is sent its keys are written to the journal, after the
+    server stored it - the keys are committed. When the same results are
+    uploaded again (e.g. script is re-run after crash), committed ones are
+    skipped. For a chunk which was sent but never committed, results created
+    in the run since then are checked, so results which did reach the server
+    are not duplicated.
+
+    Pass the journal to Run.add_results, Run.batch, AsyncReporter or
+    ResultSpool.drain:
+
+        journal = UploadJournal('nightly-1234.journal')
+        run.add_results(results, journal=journal)
+    """
+
+    # Seconds the local clock may differ from the server's one. Chunks are
+    # stamped with local time, so results created on server since
+    # 'stamp - clock_skew' are checked for a chunk in doubt.
+    clock_skew = 15 * 60
+
+    def __init__(self, path):
+        """
+        :arg path: Path to the journal file (created if missing)
+        :type path: str
+        """
+        self.path = path
+
+        self._lock = threading.Lock()
+
+        # keys of results stored on server
+        self._committed = set()
+        # {chunk id: record of chunk sent, but not committed}
+        self._in_doubt = {}
+
+        for record in ResultSpool._read(path):
+            if 'begin' in record:
+                self._in_doubt[record['begin']] = record
+            else:
+                self._committed.update(record['keys'])
+                self._in_doubt.pop(record['commit'], None)
+
+    @staticmethod
+    def key(run_id, data):
+        """
+        Returns identifier of result fields in the run.
+
+        :rtype: str
+        """
+        if 'test_id' in data:
+            target = 'test_id=%s' % data['test_id']
+        else:
+            target = 'case_id=%s' % data['case_id']
+
+        content = json.dumps(data, sort_keys=True).encode('utf-8')
+        return '%s/%s/%s' % (run_id, target, hashlib.sha1(content).hexdigest())
+
+    def _write(self, record):
+        _append_records(self.path, [record], sync=True)
+
+    def pending(self, run, items):
+        """
+        Returns (key, item) for items which are not stored on server yet.
+
+        :rtype: list of [(str, dict)]
+        """
+        keys = [self.key(run.id, item) for item in items]
+
+        with self._lock:
+            for chunk, record in list(self._in_doubt.items()):
+                if record['run_id'] == run.id and \
+                        not set(record['keys']).isdisjoint(keys):
+                    self._recover(run, chunk, record, dict(zip(keys, items)))
+
+            return [(key, item) for key, item in zip(keys, items)
+                    if key not in self._committed]
+
+    def _recover(self, run, chunk, record, items):
+        # Chunk was sent, but there is no knowledge if server stored it.
+        # Look for its results among results created since then.
+        created = set(
+            (r['test_id'], r['status_id'], r['comment'])
+            for r in TestrailAPI.get_results_for_run(
+                run.id,
+                created_after=int(record['stamp'] - self.clock_skew) - 1
+            )
+        )
+
+        tests_of_cases = None
+        stored = []
+        for key in record['keys']:
+            try:
+                item = items[key]
+            except KeyError:
+                continue
+
+            if 'test_id' in item:
+                test_id = item['test_id']
+            else:
+                if tests_of_cases is None:
+                    tests_of_cases = dict(
+                        (t['case_id'], t['id'])
+                        for t in TestrailAPI.get_tests(run.id)
+                    )
+                test_id = tests_of_cases.get(item['case_id'])
+
+            mark = (test_id, item.get('status_id'), item.get('comment'))
+            if mark in created:
+                stored.append(key)
+
+        self._write({'commit': chunk, 'keys': stored})
+        self._committed.update(stored)
+        del self._in_doubt[chunk]
+
+    def begin(self, run, keys):
+        """
+        Record that results with keys are going to be sent.
+        Returns chunk identifier.
+
+        :rtype: str
+        """
+        record = {
+            'begin': uuid.uuid4().hex,
+            'run_id': run.id,
+            'stamp': time.time(),
+            'keys': keys,
+        }
+        with self._lock:
+            self._write(record)
+            self._in_doubt[record['begin']] = record
+        return record['begin']
+
+    def commit(self, chunk, keys):
+        """
+        Record that results with keys are stored on server.
+        """
+        with self._lock:
+            self._write({'commit': chunk, 'keys': keys})
+            self._committed.update(keys)
+            self._in_doubt.pop(chunk, None)
+
+
+class _ResultWriter(object):
+    """
+    Common methods of objects which collect results and send them later.
+    """
+
+    def submit(self, run, data):
+        """
+        Take result fields (with test_id or case_id) to send to the run.
+        """
+        # Override me
+        raise NotImplementedError
+
+    def add_result(self,
+                   test,
+                   status_name=None,
+                   comment=None,
+                   version=None,
+                   elapsed=None,
+                   defects=None,
+                   assignedto=None,
+                   **custom_fields):
+        """
+        Same as Test.add_result, custom result fields can be passed by
+        system name (custom_...).
+        """
+        data = _result_data(status_name, comment, version, elapsed, defects,
+                            assignedto)
+        data.update(custom_fields)
+        data['test_id'] = test.id
+
+        self.submit(test.run, data)
+
+    def set_passed(self, test, **kwargs):
+        self.add_result(test, 'Passed', **kwargs)
+
+    def set_blocked(self, test, **kwargs):
+        self.add_result(test, 'Blocked', **kwargs)
+
+    def set_retest(self, test, **kwargs):
+        self.add_result(test, 'Retest', **kwargs)
+
+    def set_failed(self, test, **kwargs):
+        self.add_result(test, 'Failed', **kwargs)
+
+
+class ResultBatch(_ResultWriter):
+    """
+    Collects results of a run and sends them via add_results (results for
+    tests) and add_results_for_cases (results for cases) in chunks, see
+    Run.batch.
+
+    Chunk is sent when it reaches 'size' results or when 'interval' seconds
+    passed since previous sending. Rest of results are sent by flush() or on
+    exit from 'with' block.
+
+    Attributes:
+       results      -- list of created Result objects
+       errors       -- list of (result fields, exception) for rejected results
+    """
+
+    def __init__(self, run, size=100, interval=None, journal=None):
+        self.run = run
+        self.size = size
+        self.interval = interval
+        self.journal = journal
+
+        self.results = []
+        self.errors = []
+
+        self._for_tests = []
+        self._for_cases = []
+        self._sent_at = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add_result_for_case(self,
+                            case,
+                            status_name,
+                            comment='',
+                            version=None,
+                            elapsed=None,
+                            defects=None,
+                            assignedto=None,
+                            **custom_fields):
+        """
+        Same as Run.add_result_for_case, custom result fields can be passed by
+        system name (custom_...).
+        """
+        data = _result_data(status_name, comment, version, elapsed, defects,
+                            assignedto)
+        data.update(custom_fields)
+        data['case_id'] = case.id
+
+        self.submit(self.run, data)
+
+    def submit(self, run, data):
+        if 'test_id' in data:
+            items = self._for_tests
+        else:
+            items = self._for_cases
+
+        items.append(data)
+
+        if len(items) >= self.size:
+            self.flush()
+
+        elif self.interval is not None and \
+                time.time() - self._sent_at >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Send all collected results.
+
+        :rtype: None
+        """
+        for_tests, self._for_tests = self._for_tests, []
+        for_cases, self._for_cases = self._for_cases, []
+
+        for items, send in ((for_tests, TestrailAPI.add_results),
+                            (for_cases, TestrailAPI.add_results_for_cases)):
+            for start in range(0, len(items), self.size):
+                sent, failed = _upload_results(self.run,
+                                               items[start:start + self.size],
+                                               send, self.journal)
+                self.results.extend(result for item, result in sent)
+                self.errors.extend(failed)
+
+        self._sent_at = time.time()
+
+
+class AsyncReporter(_ResultWriter):
+    """
+    Sends results in background, so the caller never waits for the server.
+
+    Results are put into a bounded queue and sent by worker threads in chunks
+    via add_results/add_results_for_cases (one request per run per chunk).
+    When the queue is full, the caller is blocked until workers catch up
+    (or queue.Full is raised after 'timeout' seconds).
+    Everything collected is sent on close(), which is also called at
+    interpreter exit.
+
+    To send results of Test.add_result, Test.set_passed (and others) and
+    Run.add_result_for_case through the reporter, install it:
+
+        Testrail.reporter = AsyncReporter()
+
+    These methods return None instead of Result while reporter is installed.
+
+    Attributes:
+       sent         -- number of results stored by the server
+       errors       -- list of (result fields, exception) for rejected results
+    """
+
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(self, size=100, interval=1.0, workers=2, max_queue=10000,
+                 timeout=None, journal=None):
+        """
+        :arg size: Max number of results sent with one request
+        :arg interval: Max number of seconds a result waits to be sent,
+                       None - results are sent only by size, flush() and
+                       close()
+        :arg workers: Number of threads sending results
+        :arg max_queue: Max number of results waiting to be sent
+        :arg timeout: Max number of seconds to wait for free space in queue,
+                      None - wait forever
+        :arg journal: Journal to skip results stored by previous uploads
+
+        :type size: int
+        :type interval: float
+        :type workers: int
+        :type max_queue: int
+        :type timeout: float
+        :type journal: UploadJournal
+        """
+        self.size = size
+        self.interval = interval
+        self.timeout = timeout
+        self.journal = journal
+
+        self.sent = 0
+        self.errors = []
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self._queue = queue.Queue(max_queue)
+
+        self._workers = []
+        for _ in range(workers):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+        atexit.register(self.close)
+
+    def add_result_for_case(self,
+                            run,
+                            case,
+                            status_name,
+                            comment='',
+                            version=None,
+                            elapsed=None,
+                            defects=None,
+                            assignedto=None,
+                            **custom_fields):
+        """
+        Same as Run.add_result_for_case, custom result fields can be passed by
+        system name (custom_...).
+        """
+        data = _result_data(status_name, comment, version, elapsed, defects,
+                            assignedto)
+        data.update(custom_fields)
+        data['case_id'] = case.id
+
+        self.submit(run, data)
+
+    def submit(self, run, data):
+        if self._closed:
+            raise RuntimeError('Reporter is closed')
+
+        self._queue.put((run, data), True, self.timeout)
+
+    def flush(self):
+        """
+        Wait until all results submitted so far are sent.
+
+        :rtype: None
+        """
+        for _ in self._workers:
+            self._queue.put(self._FLUSH)
+        self._queue.join()
+
+    def close(self):
+        """
+        Send everything collected and stop workers.
+
+        :rtype: None
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        for _ in self._workers:
+            self._queue.put(self._STOP)
+        for worker in self._workers:
+            worker.join()
+
+        if Testrail.reporter is self:
+            Testrail.reporter = None
+
+        if hasattr(atexit, 'unregister'):
+            # Python 3: closed reporter is not kept alive till exit
+            atexit.unregister(self.close)
+
+    def _work(self):
+        # {(run id, 'test_id' or 'case_id'): (run, list of result fields)}
+        chunks = {}
+        sent_at = time.time()
+
+        while True:
+            try:
+                entry = self._queue.get(True, self.interval)
+            except queue.Empty:
+                entry = None
+
+            if entry is self._FLUSH or entry is self._STOP:
+                self._send(chunks, list(chunks))
+                self._queue.task_done()
+
+                if entry is self._STOP:
+                    return
+
+            elif entry is not None:
+                run, data = entry
+                key = (run.id, 'test_id' if 'test_id' in data else 'case_id')
+                chunks.setdefault(key, (run, []))[1].append(data)
+
+                if len(chunks[key][1]) >= self.size:
+                    self._send(chunks, [key])
+
+            if self.interval is not None and \
+                    time.time() - sent_at >= self.interval:
+                self._send(chunks, list(chunks))
+                sent_at = time.time()
+
+    def _send(self, chunks, keys):
+        for key in keys:
+            run, items = chunks.pop(key)
+
+            if key[1] == 'test_id':
+                send = TestrailAPI.add_results
+            else:
+                send = TestrailAPI.add_results_for_cases
+
+            try:
+                sent, failed = _upload_results(run, items, send, self.journal)
+            except Exception as e:
+                # worker must survive anything, otherwise queue will hang
+                sent, failed = [], [(item, e) for item in items]
+
+            with self._lock:
+                self.sent += len(sent)
+                self.errors.extend(failed)
+
+            for _ in items:
+                self._queue.task_done()
+
+
+class ResultSpool(_ResultWriter):
+    """
+    Durable local storage of results, for times when the server is slow or
+    unreachable.
+
+    Results are appended to a journal file (one JSON line per result) at
+    local disk speed. Later, drain() (e.g. from a separate process) sends
+    them in parallel chunks via add_results/add_results_for_cases.
+    Every stored or rejected result is recorded in 'path.done' file, and
+    chunks are recorded in 'path.journal' (UploadJournal) before they are
+    sent, so each result is sent once, even if drain() is interrupted between
+    sending a chunk and recording it as done.
+
+    Like AsyncReporter, the spool can be installed to take results of
+    Test.add_result and Run.add_result_for_case:
+
+        Testrail.reporter = ResultSpool('/var/spool/testrail/results')
+    """
+
+    def __init__(self, path, sync=False):
+        """
+        :arg path: Path to the journal file (created if missing)
+        :arg sync: True to fsync the journal after every write
+
+        :type path: str
+        :type sync: bool
+        """
+        self.path = path
+        self.done_path = path + '.done'
+        self.journal_path = path + '.journal'
+        self.sync = sync
+
+        self._lock = threading.Lock()
+
+    def _append(self, path, records):
+        with self._lock:
+            _append_records(path, records, self.sync)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as journal:
+                lines = journal.readlines()
+        except IOError:
+            return []
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # line was cut by crash while writing
+                pass
+        return records
+
+    def submit(self, run, data):
+        self.add_results(run, [data])
+
+    def add_result_for_case(self,
+                            run,
+                            case,
+                            status_name,
+                            comment='',
+                            version=None,
+                            elapsed=None,
+                            defects=None,
+                            assignedto=None,
+                            **custom_fields):
+        """
+        Same as Run.add_result_for_case, custom result fields can be passed by
+        system name (custom_...).
+        """
+        data = _result_data(status_name, comment, version, elapsed, defects,
+                            assignedto)
+        data.update(custom_fields)
+        data['case_id'] = case.id
+
+        self.submit(run, data)
+
+    def add_results(self, run, results):
+        """
+        Store many results at once (same fields as for TestrailAPI.add_results
+        or TestrailAPI.add_results_for_cases, each with test_id or case_id).
+
+        :type run: Run
+        :type results: list of [dict]
+        """
+        self._append(self.path, [
+            {'id': uuid.uuid4().hex, 'run_id': run.id, 'result': data}
+            for data in results
+        ])
+
+    def pending(self):
+        """
+        Returns journal records which are not sent yet.
+
+        :rtype: list of [dict]
+        """
+        done = set(record['id'] for record in self._read(self.done_path))
+        return [record for record in self._read(self.path)
+                if record['id'] not in done]
+
+    def drain(self, size=100, workers=4, journal=None):
+        """
+        Send all pending results.
+
+        Results rejected by the server (NotFound, AccessDenied) are marked as
+        done and returned as errors. Results which failed because of server
+        or connection problems stay pending for the next drain().
+
+        :arg size: Max number of results sent with one request
+        :arg workers: Number of parallel requests
+        :arg journal: Journal to skip results already stored on server, e.g.
+                      when previous drain() was killed while sending
+                      (default - journal of the spool, 'path.journal')
+
+        :type size: int
+        :type workers: int
+        :type journal: UploadJournal
+        :rtype: (int, list of [(dict, Exception)]) - number of sent results
+                and errors
+        """
+        if journal is None:
+            journal = _SpoolJournal(self.journal_path)
+
+        # {(run id, 'test_id' or 'case_id'): list of records}
+        groups = defaultdict(list)
+        for record in self.pending():
+            kind = 'test_id' if 'test_id' in record['result'] else 'case_id'
+            groups[(record['run_id'], kind)].append(record)
+
+        chunks = []
+        for (run_id, kind), records in groups.items():
+            for start in range(0, len(records), size):
+                chunks.append((run_id, kind, records[start:start + size]))
+
+        outcomes = _parallel_map(
+            lambda chunk: self._drain_chunk(chunk, journal), chunks, workers
+        )
+
+        sent = sum(count for count, errors in outcomes)
+        errors = [error for count, errors in outcomes for error in errors]
+        return sent, errors
+
+    def _drain_chunk(self, chunk, journal):
+        run_id, kind, records = chunk
+
+        if kind == 'test_id':
+            send = TestrailAPI.add_results
+        else:
+            send = TestrailAPI.add_results_for_cases
+
+        items = [record['result'] for record in records]
+        if isinstance(journal, _SpoolJournal):
+            journal.identify(items, records)
+
+        try:
+            run = Testrail.get_run_by_id(run_id)
+            stored = []
+            if journal is not None:
+                # results stored by previous uploads are done as well
+                pending = set(id(item) for key, item in
+                              journal.pending(run, items))
+                stored = [item for item in items if id(item) not in pending]
+            sent, failed = _upload_results(run, items, send, journal)
+        except Exception as e:
+            return 0, [(item, e) for item in items]
+
+        record_ids = dict((id(item), record['id'])
+                          for item, record in zip(items, records))
+        done = [{'id': record_ids[id(item)]} for item, result in sent]
+        done.extend({'id': record_ids[id(item)]} for item in stored)
+        done.extend(
+            {'id': record_ids[id(item)], 'error': str(e)}
+            for item, e in failed if not isinstance(e, ServerError)
+        )
+        self._append(self.done_path, done)
+
+        return len(sent), failed
+
+    def compact(self):
+        """
+        Rewrite the journal keeping pending results only.
+        Must not be called while other processes write to the spool.
+
+        :rtype: None
+        """
+        records = self.pending()
+        with self._lock:
+            temporary = self.path + '.tmp'
+            with open(temporary, 'w') as journal:
+                for record in records:
+                    journal.write(json.dumps(record) + '\n')
+            os.rename(temporary, self.path)
+            if os.path.exists(self.done_path):
+                os.remove(self.done_path)
+
+            # only chunks in doubt are needed to drain the rest
+            if os.path.exists(self.journal_path):
+                in_doubt = _SpoolJournal(self.journal_path)._in_doubt
+                with open(temporary, 'w') as journal:
+                    for record in in_doubt.values():
+                        journal.write(json.dumps(record) + '\n')
+                os.rename(temporary, self.journal_path)
+
+
+class _SpoolJournal(UploadJournal):
+    """
+    UploadJournal of a ResultSpool: results are identified by ids of spool
+    records instead of their fields, so equal results are not merged.
+    """
+
+    def __init__(self, path):
+        UploadJournal.__init__(self, path)
+
+        # {id(result fields): spool record id}
+        self._record_ids = {}
+
+    def identify(self, items, records):
+        for item, record in zip(items, records):
+            self._record_ids[id(item)] = record['id']
+
+    def key(self, run_id, data):
+        return '%s/%s' % (run_id, self._record_ids[id(data)])
+
+
+################################################################################
+# Bulk Case Writers
+################################################################################
+def _case_data(project, title=None, case_type=None, priority=None,
+               milestone=None, estimate=None, refs=None):
+    """
+    Build POST fields of a case from human-readable arguments.
+    """
+    data = {}
+
+    if title is not None:
+        data['title'] = title
+
+    if case_type is not None:
+        data['type_id'] = Testrail.get_case_type_by_name(case_type).id
+
+    if priority is not None:
+        data['priority_id'] = Testrail.get_priority_by_name(priority).id
+
+    if milestone is not None:
+        data['milestone_id'] = project.get_milestone_by_name(milestone).id
+
+    if estimate is not None:
+        data['estimate'] = estimate
+
+    if refs is not None:
+        data['refs'] = refs
+
+    return data
+
+
+class _RateLimiter(object):
+    """
+    Lets through at most 'rate' calls per second from any number of threads.
+    None rate - no limit.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.time()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+class CaseWriter(object):
+    """
+    Creates and updates many cases of a suite concurrently.
+
+    Every case is described by a dictionary (spec):
+       id           -- ID of the case to update, without it case is created
+       section      -- list of section names from the root (path) or Section
+                       object, required to create a case
+       title        -- The title of the case
+       case_type    -- Name of the case type
+       priority     -- Name (short) of the priority
+       milestone    -- Name of the milestone
+       estimate     -- The estimate, e.g. "30s" or "1m 45s"
+       refs         -- A comma-separated list of references/requirements
+       custom_...   -- Custom case fields by system name
+
+    Names of sections, types, priorities and milestones are resolved once per
+    writer, missing sections are created before cases. Requests are sent by
+    several threads, but no faster than 'rate' per second.
+
+        writer = CaseWriter(suite, workers=8, rate=10)
+        written, errors = writer.write(
+            {'section': ['Login', 'Negative'], 'title': 'Wrong password',
+             'case_type': 'Functionality', 'priority': 'High'}
+            for ... in ...
+        )
+    """
+
+    def __init__(self, suite, workers=4, rate=None, progress=None,
+                 create_sections=True):
+        """
+        :arg suite: Suite cases belong to
+        :arg workers: Number of threads sending requests
+        :arg rate: Max number of requests per second, None - no limit
+        :arg progress: function(done, total) called after every case
+        :arg create_sections: if False - cases of missing sections fail
+                              instead of creating the sections
+
+        :type suite: Suite
+        :type workers: int
+        :type rate: float
+        :type progress: callable
+        :type create_sections: bool
+        """
+        self.suite = suite
+        self.workers = workers
+        self.progress = progress
+        self.create_sections = create_sections
+
+        self._limiter = _RateLimiter(rate)
+        self._lock = threading.Lock()
+        self._done = 0
+        self._total = 0
+
+        self._case_types = dict(
+            (t.name, t.id) for t in Testrail.case_types()
+        )
+        self._priorities = dict(
+            (p.short_name, p.id) for p in Testrail.priorities()
+        )
+        self._milestones = None
+
+        # {(section name, ...): Section}
+        suite.sections()
+        self._sections = dict(suite._section_paths)
+
+        # load custom fields before threads need them
+        suite.custom_case_fields
+
+    def _section(self, path):
+        """
+        Section by path, missing sections are created (parents first).
+        """
+        path = tuple(path)
+        if path in self._sections:
+            return self._sections[path]
+
+        if not self.create_sections or not path:
+            raise NotFound('No section: %s' % ' / '.join(path))
+
+        parent = self._section(path[:-1]) if len(path) > 1 else None
+        section = self.suite.add_section(path[-1], parent=parent)
+        self._sections[path] = section
+        return section
+
+    def _milestone_id(self, name):
+        if self._milestones is None:
+            self._milestones = dict(
+                (m.name, m.id) for m in self.suite.project.milestones()
+            )
+
+        if name not in self._milestones:
+            raise NotFound('No milestone with name: %s' % name)
+        return self._milestones[name]
+
+    def _case_data(self, spec):
+        data = {}
+        for key, value in spec.items():
+            if key in ('title', 'estimate', 'refs') or \
+                    key.startswith('custom_'):
+                data[key] = value
+
+        if spec.get('case_type') is not None:
+            if spec['case_type'] not in self._case_types:
+                raise NotFound('No case type: %s' % spec['case_type'])
+            data['type_id'] = self._case_types[spec['case_type']]
+
+        if spec.get('priority') is not None:
+            if spec['priority'] not in self._priorities:
+                raise NotFound('No priority: %s' % spec['priority'])
+            data['priority_id'] = self._priorities[spec['priority']]
+
+        if spec.get('milestone') is not None:
+            data['milestone_id'] = self._milestone_id(spec['milestone'])
+
+        return data
+
+    def write(self, specs):
+        """
+        Create and update cases.
+
+        :arg specs: dictionaries describing cases (see class docs)
+
+        :type specs: iterable of [dict]
+        :rtype: (list of [(spec, Case)], list of [(spec, exception)])
+        """
+        specs = list(specs)
+        self._done = 0
+        self._total = len(specs)
+
+        # {id(spec): section id or exception}
+        section_ids = {}
+        for spec in specs:
+            if 'id' in spec:
+                continue
+
+            section = spec.get('section')
+            if not isinstance(section, Section):
+                try:
+                    section = self._section(section or ())
+                except Exception as e:
+                    section_ids[id(spec)] = e
+                    continue
+            section_ids[id(spec)] = section.id
+
+        def write_one(spec):
+            try:
+                case = self._write_one(spec, section_ids.get(id(spec)))
+                outcome = (spec, case, None)
+            except Exception as e:
+                # every spec gets its own outcome, nothing stops the others
+                outcome = (spec, None, e)
+
+            with self._lock:
+                self._done += 1
+                if self.progress is not None:
+                    self.progress(self._done, self._total)
+            return outcome
+
+        written, errors = [], []
+        for spec, case, error in _parallel_map(write_one, specs,
+                                               self.workers):
+            if error is None:
+                written.append((spec, case))
+            else:
+                errors.append((spec, error))
+        return written, errors
+
+    def _write_one(self, spec, section_id):
+        if isinstance(section_id, Exception):
+            raise section_id
+
+        data = self._case_data(spec)
+
+        self._limiter.wait()
+        if 'id' in spec:
+            payload = TestrailAPI.update_case(spec['id'], **data)
+        else:
+            payload = TestrailAPI.add_case(section_id, **data)
+
+        if payload.get('id') is None:
+            raise ServerError('Case is not saved: %s' % spec.get('title'))
+
+        return Case(payload)
+
+
+def _sync_value(key, value):
+    """
+    Return case field value in the form it has on server, so values given in
+    a spec compare equal to stored ones (e.g. estimate "90s" and "1m 30s").
+    """
+    if key == 'estimate':
+        return _timespan_to_seconds(value)
+
+    if value == '':
+        # empty fields come back as None
+        return None
+
+    if isinstance(value, list):
+        # multi-select values are stored in their own order
+        return sorted(value, key=str)
+
+    return value
+
+
+# changes SuiteSync is going to make:
+#   add_sections    -- paths of sections to create (parents first)
+#   update_sections -- list of (Section, description)
+#   add_cases       -- CaseWriter specs of cases to create
+#   update_cases    -- CaseWriter specs (with id) of cases to change
+#   delete_cases    -- ids of cases to delete
+#   delete_sections -- Sections to delete (with their subsections and cases)
+SyncPlan = namedtuple('SyncPlan', 'add_sections update_sections add_cases '
+                                  'update_cases delete_cases delete_sections')
+
+
+class SuiteSync(object):
+    """
+    Makes a suite mirror a desired tree of sections and cases.
+
+    The tree is a dictionary {section name: section}, every section is a
+    dictionary with optional keys:
+       description  -- Description of the section
+       cases        -- list of case specs (see CaseWriter, 'section' and 'id'
+                       are not needed)
+       sections     -- subsections in the same format
+
+        Suite.sync({
+            'Login': {
+                'cases': [{'title': 'Wrong password', 'priority': 'High'}],
+                'sections': {'SSO': {'cases': [{'title': 'Google'}]}},
+            },
+        })
+
+    Cases are matched by section path and title. Current state is fetched
+    with one get_sections and one get_cases request, fields given in the spec
+    are compared with ones of matched cases (as the server stores them, e.g.
+    estimate "90s" equals to "1m 30s"). So sync without changes sends no
+    writes at all. A case moved to another section is
+    deleted and created again.
+
+    Suites with several sections of the same path (same name under the same
+    parent) are not synced, plan() raises ValueError: cases of such sections
+    can't be matched with the tree.
+    """
+
+    def __init__(self, suite, tree, delete=False, workers=4, rate=None,
+                 progress=None):
+        """
+        :arg suite: Suite to sync
+        :arg tree: Desired sections and cases
+        :arg delete: if True - sections and cases missing in the tree are
+                     deleted, otherwise they stay
+        :arg workers: Number of threads sending requests
+        :arg rate: Max number of requests per second, None - no limit
+        :arg progress: function(done, total) called after every case written
+
+        :type suite: Suite
+        :type tree: dict
+        :type delete: bool
+        :type workers: int
+        :type rate: float
+        :type progress: callable
+        """
+        self.suite = suite
+        self.tree = tree
+        self.delete = delete
+        self.workers = workers
+
+        # reload current state
+        suite._sections = None
+        self.writer = CaseWriter(suite, workers, rate, progress)
+
+    def _desired(self):
+        """
+        Returns ({path: description}, [(path, spec)]) of the tree.
+        """
+        sections, cases = {}, []
+
+        stack = [((), self.tree)]
+        while stack:
+            parent_path, children = stack.pop()
+            for name, section in children.items():
+                path = parent_path + (name,)
+                sections[path] = section.get('description')
+                for spec in section.get('cases', ()):
+                    cases.append((path, spec))
+                stack.append((path, section.get('sections', {})))
+
+        return sections, cases
+
+    def plan(self):
+        """
+        Compare the tree with current state of the suite, without changing
+        anything.
+
+        :rtype: SyncPlan
+        """
+        current_sections = self.writer._sections
+
+        paths = dict((section.id, section.path)
+                     for section in self.suite.iter_sections())
+
+        duplicates = [path for path, count in Counter(paths.values()).items()
+                      if count > 1]
+        if duplicates:
+            raise ValueError('Several sections with path: %s' % '; '.join(
+                ' / '.join(path) for path in sorted(duplicates)
+            ))
+
+        # {(path, title): [case payload, ...]}
+        current_cases = defaultdict(list)
+        for case in TestrailAPI.get_cases(self.suite.project_id,
+                                          self.suite.id):
+            key = (paths.get(case['section_id']), case['title'])
+            current_cases[key].append(case)
+
+        desired_sections, desired_cases = self._desired()
+
+        add_sections = sorted(path for path in desired_sections
+                              if path not in current_sections)
+        add_sections.sort(key=len)
+
+        update_sections = [
+            (current_sections[path], description)
+            for path, description in desired_sections.items()
+            if path in current_sections and description is not None and
+            current_sections[path].description != description
+        ]
+
+        add_cases, update_cases = [], []
+        for path, spec in desired_cases:
+            matched = current_cases.get((path, spec['title']))
+            if not matched:
+                spec = dict(spec)
+                spec['section'] = path
+                add_cases.append(spec)
+                continue
+
+            case = matched.pop(0)
+            data = self.writer._case_data(spec)
+            if any(_sync_value(key, value) != _sync_value(key, case.get(key))
+                   for key, value in data.items()):
+                spec = dict((key, value) for key, value in spec.items()
+                            if key != 'section')
+                spec['id'] = case['id']
+                update_cases.append(spec)
+
+        delete_cases, delete_sections = [], []
+        if self.delete:
+            removed = set(path for path in current_sections
+                          if path not in desired_sections)
+            # top-most removed sections only, subsections go with them
+            delete_sections = [
+                current_sections[path] for path in sorted(removed)
+                if path[:-1] not in removed
+            ]
+            # cases of sections missing in the index (created after it was
+            # loaded) are left alone
+            delete_cases = [
+                case['id'] for (path, title), cases in current_cases.items()
+                for case in cases
+                if path is not None and path not in removed
+            ]
+
+        return SyncPlan(add_sections, update_sections, add_cases,
+                        update_cases, delete_cases, delete_sections)
+
+    def apply(self, plan=None):
+        """
+        Make the changes: create sections (level by level), update sections,
+        create and update cases, then delete cases and sections.
+        Requests of every step are sent concurrently.
+
+        :arg plan: result of plan(), made now if not provided
+
+        :type plan: SyncPlan
+        :rtype: (SyncPlan, list of [(SyncPlan field, target, exception)])
+        """
+        if plan is None:
+            plan = self.plan()
+
+        errors = []
+        writer = self.writer
+
+        def call(field, function):
+            def wrapped(target):
+                writer._limiter.wait()
+                try:
+                    function(target)
+                except Exception as e:
+                    errors.append((field, target, e))
+            return wrapped
+
+        def add_section(path):
+            parent = writer._sections.get(path[:-1]) if len(path) > 1 \
+                else None
+            if len(path) > 1 and parent is None:
+                raise NotFound('Parent section is not created')
+            writer._sections[path] = self.suite.add_section(
+                path[-1], description=self._description(path) or '',
+                parent=parent
+            )
+
+        depths = sorted(set(len(path) for path in plan.add_sections))
+        for depth in depths:
+            _parallel_map(call('add_sections', add_section),
+                          [path for path in plan.add_sections
+                           if len(path) == depth],
+                          self.workers)
+
+        _parallel_map(
+            call('update_sections', lambda change: change[0].update(
+                description=change[1]
+            )),
+            plan.update_sections, self.workers
+        )
+
+        written, failed = writer.write(plan.add_cases + plan.update_cases)
+        errors.extend(
+            ('update_cases' if 'id' in spec else 'add_cases', spec, e)
+            for spec, e in failed
+        )
+
+        _parallel_map(call('delete_cases', TestrailAPI.delete_case),
+                      plan.delete_cases, self.workers)
+
+        _parallel_map(
+            call('delete_sections',
+                 lambda section: TestrailAPI.delete_section(section.id)),
+            plan.delete_sections, self.workers
+        )
+        if plan.delete_sections:
+            # sections tree is loaded again when needed
+            self.suite._sections = None
+
+        return plan, errors
+
+    def _description(self, path):
+        children, section = self.tree, None
+        for name in path:
+            section = children[name]
+            children = section.get('sections', {})
+        return section.get('description')
+
+
+################################################################################
+# Test Plans
+################################################################################
+class PlanBuilder(object):
+    """
+    Assembles a test plan with all its entries and creates it with one
+    add_plan request.
+
+        builder = PlanBuilder(project, 'Release 2.0', milestone='2.0')
+        builder.add_entry('Smoke', configs={'Browser': ['Chrome', 'Firefox'],
+                                            'OS': ['Linux', 'Windows']})
+        builder.add_entry('Regression', include_all=False, cases=cases)
+        plan = builder.create()
+
+    Configuration groups and suites of the project are loaded once per
+    builder.
+
+    Attributes:
+       entries      -- POST fields of every entry added so far
+    """
+
+    def __init__(self, project, name, description='', milestone=None):
+        """
+        :arg project: Project to create plan in
+        :arg name: Name of the test plan
+        :arg description: Description of the test plan
+        :arg milestone: Name of the milestone to link plan to
+
+        :type project: Project
+        :type name: str
+        :type description: str
+        :type milestone: str
+        """
+        self.project = project
+        self.name = name
+        self.description = description
+        self.milestone = milestone
+
+        self.entries = []
+
+        self._config_groups = None
+
+    def _config_ids(self, configs):
+        """
+        Returns list of config ids per group for {group name: [config names]}.
+        """
+        if self._config_groups is None:
+            self._config_groups = dict(
+                (group.name, group) for group in self.project.configs()
+            )
+
+        ids = []
+        for group_name, config_names in sorted(configs.items()):
+            if group_name not in self._config_groups:
+                raise NotFound('No configuration group: %s' % group_name)
+            group = self._config_groups[group_name]
+
+            group_ids = []
+            for config_name in config_names:
+                if config_name not in group.configs:
+                    raise NotFound('No configuration %s in group %s' % (
+                        config_name, group_name
+                    ))
+                group_ids.append(group.configs[config_name])
+            ids.append(group_ids)
+
+        return ids
+
+    def add_entry(self, suite, configs=None, name=None, description=None,
+                  assignedto=None, include_all=True, cases=None):
+        """
+        Add entry (group of runs of one suite). If configs are given, there is
+        one run for every combination of configurations from all groups,
+        e.g. Chrome/Linux, Chrome/Windows, Firefox/Linux, Firefox/Windows.
+
+        :arg suite: Name of the suite or Suite object
+        :arg configs: Configuration names by group name
+        :arg name: Name of the runs, default - name of the suite
+        :arg description: Description of the runs
+        :arg assignedto: Name of the user to assign runs to
+        :arg include_all: if True all cases in suite will be included in runs
+        :arg cases: if include_all is False - include only this cases
+
+        :type suite: str or Suite
+        :type configs: dict of {str: list of [str]}
+        :type name: str
+        :type description: str
+        :type assignedto: str
+        :type include_all: bool
+        :type cases: list of [Cases] or case ids
+        :rtype: PlanBuilder
+        """
+        if not isinstance(suite, Suite):
+            suite = self.project.get_suite_by_name(suite)
+
+        entry = {
+            'suite_id': suite.id,
+            'include_all': bool(include_all),
+        }
+
+        if name is not None:
+            entry['name'] = name
+
+        if description is not None:
+            entry['description'] = description
+
+        if assignedto is not None:
+            entry['assignedto_id'] = Testrail.get_user_by_name(assignedto).id
+
+        if not include_all:
+            entry['case_ids'] = [getattr(c, 'id', c) for c in cases]
+
+        if configs:
+            groups = self._config_ids(configs)
+            entry['config_ids'] = [i for group in groups for i in group]
+            entry['runs'] = []
+            for combination in itertools.product(*groups):
+                run = {
+                    'include_all': entry['include_all'],
+                    'config_ids': list(combination),
+                }
+                if 'case_ids' in entry:
+                    run['case_ids'] = entry['case_ids']
+                if 'assignedto_id' in entry:
+                    run['assignedto_id'] = entry['assignedto_id']
+                entry['runs'].append(run)
+
+        self.entries.append(entry)
+        return self
+
+    def data(self):
+        """
+        POST fields of add_plan request.
+
+        :rtype: dict
+        """
+        data = {
+            'name': self.name,
+            'description': self.description,
+            'entries': self.entries,
+        }
+
+        if self.milestone is not None:
+            data['milestone_id'] = self.project.get_milestone_by_name(
+                self.milestone
+            ).id
+
+        return data
+
+    def create(self):
+        """
+        Create the plan.
+
+        :rtype: Plan
+        """
+        return Plan(TestrailAPI.add_plan(self.project.id, **self.data()))
+
+
+class PlanRouter(object):
+    """
+    Sends results of a plan to the runs they belong to, e.g. a result of
+    case 42 on Chrome/Linux goes to the Chrome/Linux run of the entry with
+    case 42.
+
+    Runs are indexed by (suite, configuration ids); when several entries have
+    the same configurations, the run is found by the case (case ids of these
+    runs are loaded once). Results are collected per run and sent with one
+    add_results_for_cases request per run per chunk.
+
+        with plan.router() as router:
+            router.add_result_for_case(42, 'Passed', configs=['Chrome',
+                                                              'Linux'])
+
+    Attributes:
+       results      -- list of created Result objects
+       errors       -- list of (result fields, exception) for rejected results
+    """
+
+    def __init__(self, plan, size=100, workers=4, journal=None):
+        self.size = size
+        self.workers = workers
+        self.journal = journal
+
+        self.results = []
+        self.errors = []
+
+        entries = plan.entries
+        if not entries:
+            # plans from listings come without entries
+            entries = TestrailAPI.get_plan(plan.id)['entries']
+
+        self.runs = [Run(r) for entry in entries for r in entry['runs']]
+
+        # {(suite id, frozenset of config ids): [Run, ...]}
+        self._by_configs = defaultdict(list)
+        for run in self.runs:
+            key = (run.suite_id, frozenset(run.config_ids or ()))
+            self._by_configs[key].append(run)
+
+        # {config name: config id}
+        self._config_ids = {}
+        for group in plan.project.configs():
+            self._config_ids.update(group.configs)
+
+        # {run id: set of case ids}, loaded for ambiguous runs only
+        self._case_ids = {}
+
+        # {run id: list of result fields}
+        self._pending = defaultdict(list)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def _runs_of_case(self, case_id, runs):
+        """
+        Select runs including the case.
+        """
+        def case_ids(run):
+            return set(row.case_id for row in run.tests(fields=['case_id']))
+
+        missing = [run for run in runs if run.id not in self._case_ids]
+        for run, ids in zip(missing, _parallel_map(case_ids, missing,
+                                                   self.workers)):
+            self._case_ids[run.id] = ids
+
+        return [run for run in runs if case_id in self._case_ids[run.id]]
+
+    def run_for(self, case, configs=()):
+        """
+        Find the run of the case with given configurations.
+
+        :arg case: Case object or case id
+        :arg configs: Configuration names, e.g. ['Chrome', 'Linux']
+
+        :type case: Case or int
+        :type configs: list of [str]
+        :rtype: Run
+        """
+        config_ids = set()
+        for name in configs:
+            if name not in self._config_ids:
+                raise NotFound('No configuration: %s' % name)
+            config_ids.add(self._config_ids[name])
+        config_ids = frozenset(config_ids)
+
+        if isinstance(case, Case):
+            runs = self._by_configs.get((case.suite_id, config_ids), [])
+            case_id = case.id
+        else:
+            runs = [run for (suite_id, ids), suite_runs
+                    in self._by_configs.items() if ids == config_ids
+                    for run in suite_runs]
+            case_id = case
+
+        if len(runs) > 1:
+            runs = self._runs_of_case(case_id, runs)
+
+        if len(runs) != 1:
+            raise NotFound('%s runs of case %s with configurations %s' % (
+                len(runs), case_id, ', '.join(configs)
+            ))
+        return runs[0]
+
+    def add_result_for_case(self,
+                            case,
+                            status_name,
+                            configs=(),
+                            comment='',
+                            version=None,
+                            elapsed=None,
+                            defects=None,
+                            assignedto=None,
+                            **custom_fields):
+        """
+        Same as Run.add_result_for_case, but the run is chosen by the case
+        and configuration names. Custom result fields can be passed by
+        system name (custom_...).
+
+        :type case: Case or int
+        :type configs: list of [str]
+        """
+        run = self.run_for(case, configs)
+
+        data = _result_data(status_name, comment, version, elapsed, defects,
+                            assignedto)
+        data.update(custom_fields)
+        data['case_id'] = getattr(case, 'id', case)
+
+        items = self._pending[run.id]
+        items.append(data)
+        if len(items) >= self.size:
+            self._send([(run, self._pending.pop(run.id))])
+
+    def flush(self):
+        """
+        Send all collected results, runs are sent concurrently.
+
+        :rtype: None
+        """
+        runs = dict((run.id, run) for run in self.runs)
+        pending, self._pending = self._pending, defaultdict(list)
+        self._send([(runs[run_id], items)
+                    for run_id, items in pending.items()])
+
+    def _send(self, chunks):
+        def send(chunk):
+            run, items = chunk
+            sent, failed = [], []
+            for start in range(0, len(items), self.size):
+                stored, rejected = _upload_results(
+                    run, items[start:start + self.size],
+                    TestrailAPI.add_results_for_cases, self.journal
+                )
+                sent.extend(stored)
+                failed.extend(rejected)
+            return sent, failed
+
+        for sent, failed in _parallel_map(send, chunks, self.workers):
+            self.results.extend(result for item, result in sent)
+            self.errors.extend(failed)
+
+
+################################################################################
+# Local Queries
+################################################################################
+def _index_key(value):
+    # lists (e.g. multi-select custom fields) are indexed as tuples
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class _Predicate(object):
+    """
+    Condition on objects of a Collection, combined with & (and), | (or)
+    and ~ (not).
+    """
+
+    # predicates checking every distinct value are evaluated last in "and"
+    scans = False
+
+    def positions(self, collection, candidates=None):
+        """
+        Returns set of positions of matching objects in the collection.
+        If candidates (set of positions) are given, result may be limited
+        to them.
+        """
+        raise NotImplementedError
+
+    def test(self, row):
+        """
+        Check one dictionary (e.g. payload from server).
+        """
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return _And(self, other)
+
+    def __or__(self, other):
+        return _Or(self, other)
+
+    def __invert__(self):
+        return _Not(self)
+
+
+class _And(_Predicate):
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def positions(self, collection, candidates=None):
+        result = candidates
+        for predicate in sorted(self.predicates, key=lambda p: p.scans):
+            matched = predicate.positions(collection, result)
+            result = matched if result is None else result & matched
+            if not result:
+                break
+        return result
+
+    def test(self, row):
+        return all(predicate.test(row) for predicate in self.predicates)
+
+
+class _Or(_Predicate):
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def positions(self, collection, candidates=None):
+        result = set()
+        for predicate in self.predicates:
+            result |= predicate.positions(collection, candidates)
+        return result
+
+    def test(self, row):
+        return any(predicate.test(row) for predicate in self.predicates)
+
+
+class _Not(_Predicate):
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def positions(self, collection, candidates=None):
+        if candidates is None:
+            candidates = set(range(len(collection)))
+        return candidates - self.predicate.positions(collection, candidates)
+
+    def test(self, row):
+        return not self.predicate.test(row)
+
+
+class _In(_Predicate):
+    def __init__(self, name, values):
+        self.name = name
+        self.values = values
+        self._keys = set(_index_key(value) for value in values)
+
+    def test(self, row):
+        return _index_key(row.get(self.name)) in self._keys
+
+    def positions(self, collection, candidates=None):
+        index = collection.hash_index(self.name)
+        result = set()
+        for value in self.values:
+            result.update(index.get(_index_key(value), ()))
+        return result
+
+
+class _Range(_Predicate):
+    def __init__(self, name, low=None, high=None, include_low=True,
+                 include_high=True):
+        self.name = name
+        self.low = low
+        self.high = high
+        self.include_low = include_low
+        self.include_high = include_high
+
+    def test(self, row):
+        value = row.get(self.name)
+        if value is None:
+            return False
+
+        if self.low is not None:
+            if value < self.low or \
+                    (value == self.low and not self.include_low):
+                return False
+        if self.high is not None:
+            if value > self.high or \
+                    (value == self.high and not self.include_high):
+                return False
+        return True
+
+    def positions(self, collection, candidates=None):
+        values, positions = collection.sorted_index(self.name)
+
+        start, end = 0, len(values)
+        if self.low is not None:
+            bound = bisect.bisect_left if self.include_low \
+                else bisect.bisect_right
+            start = bound(values, self.low)
+        if self.high is not None:
+            bound = bisect.bisect_right if self.include_high \
+                else bisect.bisect_left
+            end = bound(values, self.high)
+
+        return set(positions[start:end])
+
+
+class _Matches(_Predicate):
+    scans = True
+
+    def __init__(self, name, pattern, flags=0):
+        self.name = name
+        self.pattern = re.compile(pattern, flags)
+
+    def _match(self, value):
+        return value is not None and self.pattern.search(str(value))
+
+    def test(self, row):
+        return bool(self._match(row.get(self.name)))
+
+    def positions(self, collection, candidates=None):
+        index = collection.hash_index(self.name)
+
+        if candidates is not None and len(candidates) < len(index):
+            # check only the candidates
+            objects, name = collection.objects, self.name
+            return set(i for i in candidates
+                       if self._match(getattr(objects[i], name, None)))
+
+        # every distinct value is matched once
+        result = set()
+        for value, matched in index.items():
+            if self._match(value):
+                result.update(matched)
+        return result
+
+
+class _FieldRef(object):
+    """
+    Builds predicates on a field, see field().
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    __hash__ = object.__hash__
+
+    def __eq__(self, value):
+        return _In(self.name, [value])
+
+    def __ne__(self, value):
+        return _Not(_In(self.name, [value]))
+
+    def __lt__(self, value):
+        return _Range(self.name, high=value, include_high=False)
+
+    def __le__(self, value):
+        return _Range(self.name, high=value)
+
+    def __gt__(self, value):
+        return _Range(self.name, low=value, include_low=False)
+
+    def __ge__(self, value):
+        return _Range(self.name, low=value)
+
+    def isin(self, values):
+        return _In(self.name, list(values))
+
+    def between(self, low, high):
+        """
+        low <= value <= high
+        """
+        return _Range(self.name, low, high)
+
+    def matches(self, pattern, ignore_case=True):
+        """
+        Regular expression is found in the value.
+        """
+        return _Matches(self.name, pattern, re.I if ignore_case else 0)
+
+
+def field(name):
+    """
+    Start a predicate on system or custom field (attribute name), e.g.:
+
+        (field('priority_id') >= 3) & ~field('refs').matches('^LEGACY')
+        field('custom_area').isin([1, 2]) | (field('type_id') == 2)
+
+    :type name: str
+    :rtype: _FieldRef
+    """
+    return _FieldRef(name)
+
+
+class Collection(object):
+    """
+    List of loaded objects (e.g. Cases of a suite) with local queries.
+
+    Hash index (value -> positions) and sorted index of a field are built
+    on first use and reused by all following queries, so repeated
+    selections do not scan the objects again. Objects are never changed by
+    queries; after objects are changed, make a new Collection.
+    """
+
+    def __init__(self, objects):
+        self.objects = list(objects)
+
+        self._hash_indexes = {}
+        self._sorted_indexes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def _values(self, name):
+        return [_index_key(getattr(obj, name, None)) for obj in self.objects]
+
+    def hash_index(self, name):
+        """
+        :rtype: dict of {value: list of positions}
+        """
+        index = self._hash_indexes.get(name)
+        if index is None:
+            index = defaultdict(list)
+            for position, value in enumerate(self._values(name)):
+                index[value].append(position)
+            index = dict(index)
+            with self._lock:
+                self._hash_indexes[name] = index
+        return index
+
+    def sorted_index(self, name):
+        """
+        Values without None in ascending order and their positions.
+
+        :rtype: (list of values, list of positions)
+        """
+        index = self._sorted_indexes.get(name)
+        if index is None:
+            pairs = sorted(
+                (value, position)
+                for position, value in enumerate(self._values(name))
+                if value is not None
+            )
+            index = ([value for value, position in pairs],
+                     [position for value, position in pairs])
+            with self._lock:
+                self._sorted_indexes[name] = index
+        return index
+
+    def _positions(self, predicate):
+        if predicate is None:
+            return range(len(self.objects))
+        return sorted(predicate.positions(self))
+
+    def select(self, predicate=None):
+        """
+        Objects matching the predicate, in original order.
+
+        :rtype: list
+        """
+        return [self.objects[i] for i in self._positions(predicate)]
+
+    def count(self, predicate=None):
+        """
+        :rtype: int
+        """
+        if predicate is None:
+            return len(self.objects)
+        return len(predicate.positions(self))
+
+    def group_by(self, name, predicate=None):
+        """
+        Objects matching the predicate split by values of the field.
+
+        :rtype: dict of {value: list}
+        """
+        selected = None if predicate is None else predicate.positions(self)
+
+        groups = {}
+        for value, positions in self.hash_index(name).items():
+            if selected is not None:
+                positions = [i for i in positions if i in selected]
+            if positions:
+                groups[value] = [self.objects[i] for i in positions]
+        return groups
+
+    def count_by(self, name, predicate=None):
+        """
+        Number of objects matching the predicate per value of the field.
+
+        :rtype: dict of {value: int}
+        """
+        selected = None if predicate is None else predicate.positions(self)
+
+        counts = {}
+        for value, positions in self.hash_index(name).items():
+            if selected is None:
+                count = len(positions)
+            else:
+                count = sum(1 for i in positions if i in selected)
+            if count:
+                counts[value] = count
+        return counts
+
+
+################################################################################
+# Filter Pushdown
+################################################################################
+# Conditions listing endpoints can apply on server:
+#   {payload field: (query parameter, kind)}, where kind is
+#     'ids'   - list of ids
+#     'id'    - one id
+#     'bool'  - flag
+#     'range' - (after, before) parameters, UNIX timestamps
+_PUSHDOWN = {
+    'get_cases': {
+        'section_id': ('section_id', 'id'),
+        'type_id': ('type_id', 'ids'),
+        'priority_id': ('priority_id', 'ids'),
+        'milestone_id': ('milestone_id', 'ids'),
+        'created_by': ('created_by', 'ids'),
+        'updated_by': ('updated_by', 'ids'),
+        'created_on': (('created_after', 'created_before'), 'range'),
+        'updated_on': (('updated_after', 'updated_before'), 'range'),
+    },
+    'get_results_for_run': {
+        'status_id': ('status_id', 'ids'),
+        'created_by': ('created_by', 'ids'),
+        'created_on': (('created_after', 'created_before'), 'range'),
+    },
+    'get_runs': {
+        'suite_id': ('suite_id', 'ids'),
+        'milestone_id': ('milestone_id', 'ids'),
+        'created_by': ('created_by', 'ids'),
+        'is_completed': ('is_completed', 'bool'),
+        'created_on': (('created_after', 'created_before'), 'range'),
+    },
+    'get_plans': {
+        'milestone_id': ('milestone_id', 'ids'),
+        'created_by': ('created_by', 'ids'),
+        'is_completed': ('is_completed', 'bool'),
+        'created_on': (('created_after', 'created_before'), 'range'),
+    },
+}
+
+# {(kind of objects, ...): (source the index was built from, {name: id})}
+_name_indexes = {}
+
+
+def _name_index(key, source, objects, attribute):
+    """
+    Returns {attribute value: object id}, built once per source (cache of
+    objects) and rebuilt when the source is replaced.
+    """
+    cached = _name_indexes.get(key)
+    if cached is None or cached[0] is not source:
+        cached = (source, dict((getattr(obj, attribute), obj.id)
+                               for obj in objects))
+        _name_indexes[key] = cached
+    return cached[1]
+
+
+def _class_index(object_class, attribute):
+    objects = list(Testrail._get_objects_list(object_class))
+    return _name_index((object_class, attribute), object_class.cache,
+                       objects, attribute)
+
+
+def _project_index(project, kind):
+    objects = project.milestones() if kind == 'milestones' \
+        else project.suites()
+    return _name_index((kind, project.id), objects, objects, 'name')
+
+
+# Fields which can be filtered by names:
+#   {name field: (payload field, function(project) -> {name: id})}
+_NAMED_FIELDS = {
+    'status': ('status_id', lambda project: _class_index(Status, 'label')),
+    'case_type': ('type_id', lambda project: _class_index(CaseType, 'name')),
+    'priority': ('priority_id',
+                 lambda project: _class_index(Priority, 'short_name')),
+    'creator': ('created_by', lambda project: _class_index(User, 'name')),
+    'updater': ('updated_by', lambda project: _class_index(User, 'name')),
+    'milestone': ('milestone_id',
+                  lambda project: _project_index(project, 'milestones')),
+    'suite': ('suite_id', lambda project: _project_index(project, 'suites')),
+}
+
+_STAMP_FIELDS = ('created_on', 'updated_on', 'completed_on', 'due_on')
+
+
+def _conditions(*predicates):
+    """
+    All of predicates (None are skipped), None if there are none.
+    """
+    predicates = [p for p in predicates if p is not None]
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+    return _And(*predicates)
+
+
+def _stamp(value):
+    if isinstance(value, datetime.datetime):
+        return int(time.mktime(value.timetuple()))
+    return value
+
+
+def _resolve_names(predicate, project):
+    """
+    Rewrite conditions on names (status, creator, ...) into conditions on
+    ids, and dates into UNIX timestamps.
+    """
+    if isinstance(predicate, (_And, _Or)):
+        return predicate.__class__(*[_resolve_names(p, project)
+                                     for p in predicate.predicates])
+
+    if isinstance(predicate, _Not):
+        return _Not(_resolve_names(predicate.predicate, project))
+
+    if isinstance(predicate, _In) and predicate.name in _NAMED_FIELDS:
+        name, index = _NAMED_FIELDS[predicate.name]
+        index = index(project)
+        for value in predicate.values:
+            if value not in index:
+                raise NotFound('No %s with name: %s' % (predicate.name,
+                                                        value))
+        return _In(name, [index[value] for value in predicate.values])
+
+    if isinstance(predicate, _Range) and predicate.name in _STAMP_FIELDS:
+        return _Range(predicate.name, _stamp(predicate.low),
+                      _stamp(predicate.high), predicate.include_low,
+                      predicate.include_high)
+
+    return predicate
+
+
+def _plan_filter(endpoint, predicate, project):
+    """
+    Split the predicate into query parameters of the endpoint and a
+    residual predicate to check locally.
+
+    Only top-level "and" conditions can be pushed to server: membership on
+    fields the endpoint filters by, and date ranges (which are also checked
+    locally, because bounds of the server are not exact).
+
+    :rtype: (dict of query parameters, _Predicate or None)
+    """
+    if predicate is None:
+        return {}, None
+
+    predicate = _resolve_names(predicate, project)
+
+    terms, stack = [], [predicate]
+    while stack:
+        term = stack.pop(0)
+        if isinstance(term, _And):
+            stack[:0] = list(term.predicates)
+        else:
+            terms.append(term)
+
+    supported = _PUSHDOWN[endpoint]
+    params, residual = {}, []
+
+    for term in terms:
+        param, kind = supported.get(getattr(term, 'name', None),
+                                    (None, None))
+
+        if isinstance(term, _In) and param not in params and \
+                None not in term.values:
+            if kind == 'ids':
+                params[param] = [str(value) for value in term.values]
+                continue
+            if kind == 'id' and len(term.values) == 1:
+                params[param] = term.values[0]
+                continue
+            if kind == 'bool' and len(term.values) == 1:
+                params[param] = bool(term.values[0])
+                continue
+
+        if isinstance(term, _Range) and kind == 'range':
+            after, before = param
+            if term.low is not None:
+                params[after] = max(params.get(after, term.low), term.low)
+            if term.high is not None:
+                params[before] = min(params.get(before, term.high),
+                                     term.high)
+
+        residual.append(term)
+
+    return params, _conditions(*residual)
+
+
+def _filter_rows(payloads, residual):
+    """
+    Payloads matching the residual predicate.
+    """
+    if residual is None:
+        return payloads
+    return [payload for payload in payloads if residual.test(payload)]
+
+
+################################################################################
+# Time Window Scans
+################################################################################
+def _windowed_fetch(fetch, after, before, workers, page=250):
+    """
+    Fetch rows created in [after, before] (UNIX timestamps) by concurrent
+    requests for sub-windows.
+
+    fetch(after, before, limit, offset) returns rows of a window, newest
+    first. Time is split into one window per worker, and every window is
+    read page by page with offset, like a serial scan, so no page is thrown
+    away. Requests of adjacent windows overlap by one second and rows out of
+    the window are dropped, so rows at the bounds are not lost whether the
+    server treats the bounds as inclusive or not. Rows are returned newest
+    first without duplicates (by id).
+
+    Windows are equal by time, so rows created in bursts are mostly read by
+    one worker, with about as many requests as a serial scan.
+
+    :rtype: list of [dict]
+    """
+    windows = _split_window(after, before, workers)
+
+    def fetch_window(window):
+        low, high = window
+        # outer bounds are passed as they are
+        request_low = low - 1 if low > after else low
+        request_high = high + 1 if high < before else high
+
+        rows, offset = [], 0
+        while True:
+            more = fetch(request_low, request_high, page, offset or None)
+            if not isinstance(more, list):
+                raise ServerError('Unexpected response on rows created in '
+                                  '%s - %s' % (low, high))
+            offset += len(more)
+            rows.extend(row for row in more
+                        if low <= row['created_on'] <= high)
+            if len(more) < page:
+                return rows
+
+    merged, seen = [], set()
+    # windows go oldest first
+    for rows in reversed(_parallel_map(fetch_window, windows, workers)):
+        for row in rows:
+            if row['id'] not in seen:
+                seen.add(row['id'])
+                merged.append(row)
+    return merged
+
+
+def _split_window(after, before, parts):
+    """
+    Split [after, before] into up to 'parts' adjacent windows.
+    """
+    span = before - after + 1
+    parts = max(1, min(parts, span))
+
+    bounds = [after + span * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(parts)]
+
+
+################################################################################
+# Run Index
+################################################################################
+# change made by a new result of a test:
+#   test     -- Test the result was added to
+#   result   -- the new Result
+#   previous -- status id of the test before the result
+ResultChange = namedtuple('ResultChange', 'test result previous')
+
+
+class RunIndex(object):
+    """
+    Tests of a run with their latest results, loaded by one get_tests and one
+    get_results_for_run. Lookups by case id, test id and status are served
+    from dictionaries:
+
+        index = run.index()
+        index.test_for_case(1234).status
+        index.tests_with_status('Failed')
+        ...
+        index.refresh()   # only results added since the last refresh
+
+    Statuses of Test objects are updated by new results.
+
+    Attributes:
+       run          -- indexed Run
+       tests        -- list of Tests in the run
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.load()
+
+    def load(self):
+        """
+        Load all tests and results of the run again.
+        """
+        self.tests = self.run.tests()
+
+        self._by_id = dict((t.id, t) for t in self.tests)
+        self._by_case = dict((t.case_id, t) for t in self.tests)
+        # {status_id: {test_id: Test}}
+        self._by_status = defaultdict(dict)
+        for test in self.tests:
+            self._by_status[test.status_id][test.id] = test
+
+        # {test_id: (created_on, id) of the latest result}
+        self._latest = {}
+        # created_on of the newest result seen and {id: created_on} of
+        # results created near it (to skip them when they come again)
+        self._cursor = None
+        self._recent = {}
+
+        results = TestrailAPI.get_results_for_run(self.run.id)
+        latest = {}
+        for payload in results:
+            self._see(payload)
+            key = (payload['created_on'], payload['id'])
+            if key > self._latest.get(payload['test_id'], (0, 0)):
+                self._latest[payload['test_id']] = key
+                latest[payload['test_id']] = payload
+
+        for result in Result._build_many(list(latest.values()),
+                                         self.run.custom_result_fields):
+            test = self._by_id.get(result.test_id)
+            if test is not None:
+                test._latest_result = result
+
+        for test in self.tests:
+            if test.id not in latest:
+                test._latest_result = None
+
+    def _see(self, payload):
+        """
+        Move the cursor to the payload, returns False if the result was seen
+        before.
+        """
+        if payload['id'] in self._recent:
+            return False
+
+        created_on = payload['created_on']
+        if self._cursor is None or created_on > self._cursor:
+            self._cursor = created_on
+            self._recent = dict((i, stamp) for i, stamp in self._recent.items()
+                                if stamp >= created_on - 1)
+        if created_on >= self._cursor - 1:
+            self._recent[payload['id']] = created_on
+        return True
+
+    def refresh(self):
+        """
+        Apply results added to the run since the last load or refresh.
+        Returns changes in order the results were added.
+
+        :rtype: list of [ResultChange]
+        """
+        if self._cursor is None:
+            payloads = TestrailAPI.get_results_for_run(self.run.id)
+        else:
+            # results added later within the second of the cursor are not
+            # "after" it, so the second before the cursor is requested too
+            payloads = TestrailAPI.get_results_for_run(
+                self.run.id, created_after=self._cursor - 1
+            )
+
+        payloads = sorted(payloads,
+                          key=lambda p: (p['created_on'], p['id']))
+        payloads = [p for p in payloads if self._see(p)]
+        if not payloads:
+            return []
+
+        unknown = set(p['test_id'] for p in payloads) - set(self._by_id)
+        if unknown:
+            # tests added to the run after the index was loaded
+            for test in Testrail.get_tests_by_ids(unknown):
+                self._add_test(test)
+
+        changes = []
+        for result in Result._build_many(payloads,
+                                         self.run.custom_result_fields):
+            test = self._by_id[result.test_id]
+            previous = test.status_id
+
+            key = (result.created_on_stamp, result.id)
+            if key > self._latest.get(test.id, (0, 0)):
+                self._latest[test.id] = key
+                test._latest_result = result
+
+                if result.status_id is not None:
+                    # comments (results without status) do not change it
+                    del self._by_status[previous][test.id]
+                    self._by_status[result.status_id][test.id] = test
+                    test.status_id = result.status_id
+
+            changes.append(ResultChange(test, result, previous))
+
+        return changes
+
+    def _add_test(self, test):
+        self.tests.append(test)
+        self._by_id[test.id] = test
+        self._by_case[test.case_id] = test
+        self._by_status[test.status_id][test.id] = test
+        test._latest_result = None
+
+    def test(self, test_id):
+        """
+        :type test_id: int
+        :rtype: Test
+        """
+        try:
+            return self._by_id[test_id]
+        except KeyError:
+            raise NotFound('No test %s in run %s' % (test_id, self.run.id))
+
+    def test_for_case(self, case_id):
+        """
+        :type case_id: int
+        :rtype: Test
+        """
+        try:
+            return self._by_case[case_id]
+        except KeyError:
+            raise NotFound('No test for case C%s in run %s' % (case_id,
+                                                               self.run.id))
+
+    def latest_result(self, test_id):
+        """
+        Latest result of the test, None if there are no results.
+
+        :type test_id: int
+        :rtype: Result
+        """
+        return self.test(test_id).latest_result
+
+    def tests_with_status(self, status_name):
+        """
+        :type status_name: str
+        :rtype: list of [Test]
+        """
+        status_id = Testrail.get_status_by_name(status_name).id
+        return list(self._by_status.get(status_id, {}).values())
+
+    def counts(self):
+        """
+        Number of tests by status label (statuses without tests are omitted).
+
+        :rtype: dict
+        """
+        return dict(
+            (Testrail.get_status_by_id(status_id).label, len(tests))
+            for status_id, tests in self._by_status.items() if tests
+        )
+
+
+class RunWatcher(object):
+    """
+    Follows progress of a run. Tests are loaded once, then every poll costs
+    one get_results_for_run request for results added since the previous
+    poll, and the state is updated from these results only.
+
+        def show(watcher, changes):
+            print(watcher.counts, watcher.pass_rate)
+
+        watcher = run.watch(interval=10)
+        watcher.subscribe(show)
+        watcher.start()
+        ...
+        watcher.stop()
+
+    or call poll() from your own loop instead of start().
+
+    Attributes:
+       index        -- RunIndex with tests of the run and their latest results
+       counts       -- {status label: number of tests}
+       pass_rate    -- share of tests with status Passed (0.0 - 1.0)
+       completion   -- share of tests with any status but Untested
+       errors       -- exceptions raised by polls in background
+    """
+
+    def __init__(self, run, interval=10.0):
+        """
+        :arg interval: Number of seconds between polls in background
+
+        :type run: Run
+        :type interval: float
+        """
+        self.index = run.index()
+        self.interval = interval
+        self.errors = []
+
+        self._listeners = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self._summarize()
+
+    def subscribe(self, listener):
+        """
+        Call listener(watcher, changes) after every poll which brought new
+        results, changes are ResultChange tuples in order of results.
+        """
+        self._listeners.append(listener)
+
+    def poll(self):
+        """
+        Apply results added since the previous poll and notify listeners.
+
+        :rtype: list of [ResultChange]
+        """
+        changes = self.index.refresh()
+        if changes:
+            self._summarize()
+            for listener in self._listeners:
+                listener(self, changes)
+        return changes
+
+    def _summarize(self):
+        self.counts = self.index.counts()
+
+        total = len(self.index.tests)
+        passed = untested = 0
+        for status in Testrail.statuses():
+            count = self.counts.get(status.label, 0)
+            if status.name == 'passed':
+                passed += count
+            if status.is_untested:
+                untested += count
+
+        self.pass_rate = float(passed) / total if total else 0.0
+        self.completion = float(total - untested) / total if total else 0.0
+
+    def start(self):
+        """
+        Poll in background every 'interval' seconds until stop().
+
+        :rtype: None
+        """
+        if self._thread is not None:
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._work)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop polling in background.
+
+        :rtype: None
+        """
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _work(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # server may be unavailable for a while, try on the next poll
+                self.errors.append(e)
+
+
+################################################################################
+# Columnar Tables
+################################################################################
+_TIMESPAN_UNITS = {
+    'w': 7 * 24 * 60 * 60,
+    'd': 24 * 60 * 60,
+    'h': 60 * 60,
+    'm': 60,
+    's': 1,
+}
+
+
+def _timespan_to_seconds(timespan):
+    """
+    Convert Testrail timespan (e.g. "1m 45s" or "1.5h") to number of
+    seconds. None and empty timespan are 0 seconds, parts which are not
+    numbers of known units are ignored.
+    """
+    if not timespan:
+        return 0
+
+    seconds = 0.0
+    for part in timespan.split():
+        try:
+            seconds += float(part[:-1]) * _TIMESPAN_UNITS[part[-1]]
+        except (ValueError, KeyError):
+            continue
+    return int(round(seconds))
+
+
+def _seconds_to_timespan(seconds):
+    """
+    Convert number of seconds to Testrail timespan (e.g. "1m 45s").
+    Testrail does not accept zero timespan, so it is at least "1s".
+    """
+    seconds = max(int(round(seconds)), 1)
+
+    parts = []
+    for unit in 'hms':
+        count, seconds = divmod(seconds, _TIMESPAN_UNITS[unit])
+        if count:
+            parts.append('%s%s' % (count, unit))
+    return ' '.join(parts)
+
+
+class Table(object):
+    """
+    Column-oriented container of tests or results, see Run.tests and
+    Run.results with columnar=True.
+
+    Every column is an array with one item per row: numpy arrays if numpy is
+    installed, array.array otherwise.
+    Empty (None) ids are stored as 0, dates - as UNIX timestamps, timespans
+    (elapsed, estimate) - as number of seconds.
+    String columns are dictionary encoded: column holds integer codes, and
+    list of strings for the codes is available via values(name).
+
+    Example:
+        results = run.results(columnar=True)
+        results.count_by('status_id')
+        results.between('created_on', start_stamp, end_stamp)
+    """
+
+    # (column name, payload key, kind)
+    TEST_COLUMNS = (
+        ('id', 'id', 'int'),
+        ('run_id', 'run_id', 'int'),
+        ('case_id', 'case_id', 'int'),
+        ('status_id', 'status_id', 'int'),
+        ('type_id', 'type_id', 'int'),
+        ('priority_id', 'priority_id', 'int'),
+        ('milestone_id', 'milestone_id', 'int'),
+        ('assignedto_id', 'assignedto_id', 'int'),
+        ('estimate', 'estimate', 'timespan'),
+        ('title', 'title', 'str'),
+        ('refs', 'refs', 'str'),
+    )
+
+    RESULT_COLUMNS = (
+        ('id', 'id', 'int'),
+        ('test_id', 'test_id', 'int'),
+        ('status_id', 'status_id', 'int'),
+        ('created_by', 'created_by', 'int'),
+        ('assignedto_id', 'assignedto_id', 'int'),
+        ('created_on', 'created_on', 'stamp'),
+        ('elapsed', 'elapsed', 'timespan'),
+        ('version', 'version', 'str'),
+        ('defects', 'defects', 'str'),
+    )
+
+    def __init__(self, columns, dictionaries):
+        """
+        :arg columns: {column name: array}
+        :arg dictionaries: {column name: list of values} for encoded columns
+        """
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    @classmethod
+    def from_payloads(cls, payloads, spec):
+        """
+        Build table from list of dictionaries returned by server.
+
+        :arg spec: TEST_COLUMNS, RESULT_COLUMNS or similar description
+        """
+        columns = {}
+        dictionaries = {}
+
+        for name, key, kind in spec:
+            if kind == 'int':
+                column = array.array('l', [p[key] or 0 for p in payloads])
+
+            elif kind == 'stamp':
+                column = array.array('d', [p[key] or 0 for p in payloads])
+
+            elif kind == 'timespan':
+                column = array.array('l', [
+                    _timespan_to_seconds(p[key]) for p in payloads
+                ])
+
+            else:
+                codes = {}
+                column = array.array('l', [
+                    codes.setdefault(p[key], len(codes)) for p in payloads
+                ])
+                values = [None] * len(codes)
+                for value, code in codes.items():
+                    values[code] = value
+                dictionaries[name] = values
+
+            if numpy is not None:
+                column = numpy.frombuffer(column, dtype=column.typecode)
+
+            columns[name] = column
+
+        return cls(columns, dictionaries)
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def values(self, name):
+        """
+        Return list of strings of dictionary encoded column, where index of
+        the string is its code in the column.
+
+        :rtype: list
+        """
+        return self.dictionaries[name]
+
+    def decoded(self, name):
+        """
+        Return column as list of values (strings for encoded columns).
+
+        :rtype: list
+        """
+        column = self.columns[name]
+        if name in self.dictionaries:
+            values = self.dictionaries[name]
+            return [values[code] for code in column]
+        return list(column)
+
+    def take(self, indexes):
+        """
+        Return new table made of rows with provided indexes (or boolean mask,
+        if numpy is installed).
+
+        :rtype: Table
+        """
+        if numpy is not None:
+            columns = dict(
+                (name, column[indexes])
+                for name, column in self.columns.items()
+            )
+        else:
+            columns = dict(
+                (name, array.array(column.typecode,
+                                   [column[i] for i in indexes]))
+                for name, column in self.columns.items()
+            )
+
+        return Table(columns, self.dictionaries)
+
+    def between(self, name, low=None, high=None):
+        """
+        Return new table with rows where low <= value < high.
+
+        :rtype: Table
+        """
+        column = self.columns[name]
+
+        if numpy is not None:
+            mask = numpy.ones(len(column), dtype=bool)
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column < high
+            return self.take(mask)
+
+        return self.take([
+            i for i, value in enumerate(column)
+            if (low is None or value >= low) and
+            (high is None or value < high)
+        ])
+
+    def count_by(self, name):
+        """
+        Count rows by values of the column.
+
+        :rtype: dict
+        """
+        column = self.columns[name]
+
+        if numpy is not None:
+            keys, counts = numpy.unique(column, return_counts=True)
+            counts = dict(zip(keys.tolist(), counts.tolist()))
+        else:
+            counts = Counter(column)
+
+        if name in self.dictionaries:
+            values = self.dictionaries[name]
+            return dict((values[code], count)
+                        for code, count in counts.items())
+        return dict(counts)
+
+    def group_by(self, name):
+        """
+        Split table by values of the column.
+
+        :rtype: dict of {value: Table}
+        """
+        column = self.columns[name]
+        groups = defaultdict(list)
+
+        if numpy is not None:
+            keys, inverse = numpy.unique(column, return_inverse=True)
+            # row indexes ordered by group, split where the next group starts
+            order = numpy.argsort(inverse, kind='stable')
+            bounds = numpy.cumsum(numpy.bincount(inverse))[:-1]
+            groups = dict(zip(keys.tolist(), numpy.split(order, bounds)))
+        else:
+            for i, value in enumerate(column):
+                groups[value].append(i)
+
+        if name in self.dictionaries:
+            values = self.dictionaries[name]
+            return dict((values[code], self.take(indexes))
+                        for code, indexes in groups.items())
+        return dict((value, self.take(indexes))
+                    for value, indexes in groups.items())
+
+
+################################################################################
+# JUnit Import
+################################################################################
+# outcome of JUnit testcase -> Testrail status name
+_JUNIT_STATUSES = {
+    'passed': 'Passed',
+    'failure': 'Failed',
+    'error': 'Failed',
+    'skipped': 'Blocked',
+}
+
+# summary of import_junit:
+#   run       -- Run results were added to (None if nothing was matched)
+#   sent      -- number of results stored by the server
+#   errors    -- list of (result fields, exception) for rejected results
+#   unmatched -- names of testcases no case was found for
+JUnitImport = namedtuple('JUnitImport', 'run sent errors unmatched')
+
+
+def _junit_testcases(source):
+    """
+    Iterate over testcases of JUnit/xUnit XML report. Every testcase element
+    is removed from the tree once it is processed, so memory does not grow
+    with the size of the report.
+
+    Yields (name, classname, seconds, outcome, message, properties).
+    """
+    parents = []
+    for event, element in ElementTree.iterparse(source, ('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+
+        parents.pop()
+        if element.tag != 'testcase':
+            continue
+
+        outcome, message = 'passed', ''
+        for child in element:
+            if child.tag in ('failure', 'error', 'skipped'):
+                outcome = child.tag
+                message = '\n'.join(
+                    part for part in (child.get('message'), child.text)
+                    if part and part.strip()
+                )
+                break
+
+        properties = dict(
+            (prop.get('name'), prop.get('value'))
+            for prop in element.iter('property')
+        )
+
+        yield (element.get('name', ''), element.get('classname', ''),
+               float(element.get('time') or 0), outcome, message, properties)
+
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+
+
+def _junit_cases(source, titles, suite_case_ids, case_property):
+    """
+    Iterate over testcases of the report matched with cases of the suite.
+
+    Yields (full name, case id or None, testcase from _junit_testcases).
+    """
+    if hasattr(source, 'seek'):
+        # file object is read once for every pass
+        source.seek(0)
+
+    for testcase in _junit_testcases(source):
+        name, classname, seconds, outcome, message, properties = testcase
+        full_name = '%s.%s' % (classname, name) if classname else name
+
+        if properties.get(case_property):
+            case_id = int(properties[case_property].lstrip('Cc'))
+        else:
+            case_id = titles.get(name) or titles.get(full_name)
+
+        if case_id not in suite_case_ids:
+            case_id = None
+
+        yield full_name, case_id, testcase
+
+
+def _seekable(source):
+    """
+    Return source (path or file object) which can be read several times:
+    pipes (e.g. stdin) are copied to a temporary file first.
+    """
+    if not hasattr(source, 'read'):
+        return source
+
+    try:
+        source.seek(source.tell())
+        return source
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+
+    copy = tempfile.TemporaryFile()
+    data = source.read(1024 * 1024)
+    while data:
+        copy.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+        data = source.read(1024 * 1024)
+    copy.seek(0)
+    return copy
+
+
+def _junit_run(suite, run, run_name, case_ids, suite_case_ids):
+    """
+    Make sure all matched cases (case_ids) are included in the run: create
+    the run with them, or add missing ones with one update_run request.
+    Run includes all cases of the suite when all of them are matched.
+    """
+    if run is None:
+        if case_ids == suite_case_ids:
+            return suite.add_run(name=run_name, include_all=True)
+        return suite.add_run(name=run_name, include_all=False,
+                             cases=sorted(case_ids))
+
+    if not run.include_all:
+        included = set(row.case_id for row in run.tests(fields=['case_id']))
+        if not case_ids <= included:
+            TestrailAPI.update_run(run.id, include_all=False,
+                                   case_ids=sorted(included | case_ids))
+    return run
+
+
+def import_junit(source, suite, run=None, run_name=None,
+                 case_property='testrail_case_id', version=None, size=100,
+                 journal=None):
+    """
+    Import results from JUnit/xUnit XML report.
+    Report is read incrementally twice: the first pass collects matched
+    cases to create the run with (or add to the run) by one request, the
+    second one sends results in chunks via add_results_for_cases, so reports
+    of any size can be imported. File objects which do not support seek()
+    (e.g. stdin) are copied to a temporary file first.
+
+    Testcase is linked to a case by its property (<property name="..."
+    value="C1234"/>), otherwise by case title equal to testcase name or
+    to "classname.name". Titles which are not unique in the suite are not
+    used, ids of cases from other suites are ignored.
+
+    :arg source: Path to report or file object
+    :arg suite: Suite the cases belong to
+    :arg run: Run to add results to, if None - new run is created with
+              matched cases only
+    :arg run_name: Name of the new run
+    :arg case_property: Name of testcase property holding case id
+    :arg version: Version of tested product for every result
+    :arg size: Max number of results sent with one request
+    :arg journal: Journal to skip results stored by previous imports
+
+    :type source: str or file
+    :type suite: Suite
+    :type run: Run
+    :type run_name: str
+    :type case_property: str
+    :type version: str
+    :type size: int
+    :type journal: UploadJournal
+    :rtype: JUnitImport
+    """
+    source = _seekable(source)
+
+    # {title: case id}, None for titles of several cases
+    titles = {}
+    suite_case_ids = set()
+    for row in suite.cases(fields=['id', 'title']):
+        titles[row.title] = None if row.title in titles else row.id
+        suite_case_ids.add(row.id)
+
+    # the first pass finds cases to include in the run, so the run is
+    # created (or updated) with one request
+    case_ids = set(case_id for full_name, case_id, testcase in
+                   _junit_cases(source, titles, suite_case_ids, case_property)
+                   if case_id is not None)
+    if not case_ids:
+        unmatched = [full_name for full_name, case_id, testcase in
+                     _junit_cases(source, titles, suite_case_ids,
+                                  case_property)]
+        return JUnitImport(run, 0, [], unmatched)
+
+    if run is None and run_name is None:
+        run_name = 'JUnit import %s' % (
+            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        )
+    run = _junit_run(suite, run, run_name, case_ids, suite_case_ids)
+
+    sent, errors, unmatched, chunk = 0, [], [], []
+
+    testcases = _junit_cases(source, titles, suite_case_ids, case_property)
+    while True:
+        full_name, case_id, testcase = next(testcases, (None, None, None))
+
+        if testcase is not None:
+            if case_id is None:
+                unmatched.append(full_name)
+                continue
+
+            name, classname, seconds, outcome, message, properties = testcase
+            data = _result_data(
+                _JUNIT_STATUSES[outcome], message, version,
+                _seconds_to_timespan(seconds) if seconds else None
+            )
+            data['case_id'] = case_id
+            chunk.append(data)
+
+        if chunk and (len(chunk) >= size or testcase is None):
+            stored, failed = _upload_results(
+                run, chunk, TestrailAPI.add_results_for_cases, journal
+            )
+            sent += len(stored)
+            errors.extend(failed)
+            chunk = []
+
+        if testcase is None:
+            return JUnitImport(run, sent, errors, unmatched)
@@ -0,0 +1,288 @@
+# -*- coding:utf-8 -*-
+"""
+pytest plugin which sends test results to a Testrail run while tests are
+running.
+
+Enable it with:
+
+    pytest -p testrail_pytest --testrail --testrail-host=192.168.1.1 \
+           --testrail-user=someuser@domain.dom --testrail-password=... \
+           --testrail-project='My Project' --testrail-suite='My Suite'
+
+(host, port, user and password can also be set by TESTRAIL_HOST,
+TESTRAIL_PORT, TESTRAIL_USER and TESTRAIL_PASSWORD environment variables).
+
+Test is linked to a case by marker:
+
+    @pytest.mark.testrail(1234)
+    def test_login():
+        ...
+
+or by case id in the test name: test_C1234_login.
+
+A new run with linked cases is created in the suite (or results are added to
+existing run with --testrail-run-id). Results are sent in background in
+chunks via add_results_for_cases, so tests never wait for the server.
+
+With pytest-xdist, workers only attach case ids to their reports. The run is
+created and all results are sent by the controller process, so the whole
+session uses one run and one set of connections.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import re
+import datetime
+
+import pytest
+
+import testrail
+from testrail import Testrail, TestrailAPI, AsyncReporter
+
+
+# case id in test name: test_C1234_login, TestC1234.test_login
+CASE_IN_NAME = re.compile(r'(?<![A-Z0-9])C(\d+)(?![0-9])')
+
+# pytest outcome -> Testrail status name
+STATUSES = {
+    'passed': 'Passed',
+    'failed': 'Failed',
+    'skipped': 'Blocked',
+}
+
+# Testrail does not store comments of unlimited length
+MAX_COMMENT = 4000
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('testrail')
+    group.addoption('--testrail', action='store_true', default=False,
+                    help='Send results to Testrail')
+    group.addoption('--testrail-host',
+                    default=os.environ.get('TESTRAIL_HOST', ''),
+                    help='Testrail host')
+    group.addoption('--testrail-port',
+                    default=os.environ.get('TESTRAIL_PORT', '80'),
+                    help='Testrail port')
+    group.addoption('--testrail-user',
+                    default=os.environ.get('TESTRAIL_USER', ''),
+                    help='Testrail user')
+    group.addoption('--testrail-password',
+                    default=os.environ.get('TESTRAIL_PASSWORD', ''),
+                    help='Testrail password or API key')
+    group.addoption('--testrail-project',
+                    help='Name of the project to create run in')
+    group.addoption('--testrail-suite',
+                    help='Name of the suite to create run from')
+    group.addoption('--testrail-run-name',
+                    help='Name of the new run (default - current time)')
+    group.addoption('--testrail-run-id', type=int,
+                    help='Add results to existing run instead of new one')
+    group.addoption('--testrail-batch-size', type=int, default=100,
+                    help='Max number of results sent with one request')
+    group.addoption('--testrail-interval', type=float, default=5.0,
+                    help='Max number of seconds a result waits to be sent')
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'testrail(case_id): Testrail case checked by the test'
+    )
+
+    if config.getoption('testrail'):
+        config.pluginmanager.register(TestrailPlugin(config),
+                                      'testrail_reporter')
+
+
+def case_id_from_name(nodeid):
+    """
+    Case id from the test name (last part of nodeid, parameters ignored),
+    None if there is no id in the name.
+    """
+    names = nodeid.split('[')[0].split('::')[1:]
+    for name in reversed(names):
+        match = CASE_IN_NAME.search(name)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def case_id_of(item):
+    """
+    Case id from testrail marker or from the test name.
+    """
+    marker = item.get_closest_marker('testrail')
+    if marker is not None and marker.args:
+        return int(str(marker.args[0]).lstrip('Cc'))
+
+    return case_id_from_name(item.nodeid)
+
+
+class TestrailPlugin(object):
+    """
+    Creates the run and reports results of a session.
+
+    Attributes:
+       run          -- Run results are sent to (None until tests are collected)
+       reporter     -- AsyncReporter sending results
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.run = None
+        self.reporter = None
+
+        # xdist worker: only marks reports, controller does the rest
+        self.is_worker = hasattr(config, 'workerinput')
+
+        # ids of cases included in the run
+        self._case_ids = set()
+        # results of cases which are not included in the run yet
+        self._held = []
+
+        if not self.is_worker:
+            Testrail(host=config.getoption('testrail_host'),
+                     port=config.getoption('testrail_port'),
+                     user=config.getoption('testrail_user'),
+                     password=config.getoption('testrail_password'))
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        for item in items:
+            case_id = case_id_of(item)
+            if case_id is not None:
+                item.user_properties.append(('testrail_case_id', case_id))
+
+    def pytest_collection_finish(self, session):
+        if self.is_worker:
+            return
+
+        case_ids = set()
+        for item in session.items:
+            case_id = dict(item.user_properties).get('testrail_case_id')
+            if case_id is not None:
+                case_ids.add(case_id)
+
+        self._start(case_ids)
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_xdist_node_collection_finished(self, node, ids):
+        # Controller does not collect tests itself, so only case ids from
+        # names are known here. Cases linked by markers are added to the run
+        # when their results come.
+        if self.run is None:
+            case_ids = set(case_id_from_name(nodeid) for nodeid in ids)
+            case_ids.discard(None)
+            self._start(case_ids)
+
+    def _start(self, case_ids):
+        config = self.config
+
+        run_id = config.getoption('testrail_run_id')
+        if run_id is not None:
+            self.run = Testrail.get_run_by_id(run_id)
+            self._case_ids = set(row.case_id for row in
+                                 self.run.tests(fields=['case_id']))
+        else:
+            project = Testrail.get_project_by_name(
+                config.getoption('testrail_project')
+            )
+            suite = project.get_suite_by_name(
+                config.getoption('testrail_suite')
+            )
+            name = config.getoption('testrail_run_name') or (
+                'Automated run %s' %
+                datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            )
+            self.run = suite.add_run(name=name, include_all=False,
+                                     cases=sorted(case_ids))
+            self._case_ids = set(case_ids)
+
+        self.reporter = AsyncReporter(
+            size=config.getoption('testrail_batch_size'),
+            interval=config.getoption('testrail_interval'),
+            workers=1
+        )
+
+    def pytest_runtest_logreport(self, report):
+        if self.is_worker or self.reporter is None:
+            return
+
+        # one result per test: outcome of the call, or of the setup if the
+        # test did not get to the call
+        if report.when == 'teardown':
+            return
+        if report.when == 'setup' and report.passed:
+            return
+
+        case_id = dict(report.user_properties).get('testrail_case_id')
+        if case_id is None:
+            case_id = case_id_from_name(report.nodeid)
+        if case_id is None:
+            return
+
+        data = testrail._result_data(
+            STATUSES[report.outcome],
+            comment=self._comment(report),
+            elapsed=testrail._seconds_to_timespan(report.duration)
+        )
+        data['case_id'] = case_id
+
+        if case_id in self._case_ids or self.run.include_all:
+            self.reporter.submit(self.run, data)
+        else:
+            self._held.append(data)
+            if len(self._held) >= self.config.getoption('testrail_batch_size'):
+                self._release_held()
+
+    @staticmethod
+    def _comment(report):
+        if hasattr(report, 'wasxfail'):
+            text = 'Expected failure: %s' % report.wasxfail
+        elif report.skipped and isinstance(report.longrepr, tuple):
+            text = report.longrepr[2]
+        elif report.failed:
+            text = report.longreprtext
+        else:
+            text = ''
+
+        text = '%s\n%s' % (report.nodeid, text)
+        return text[:MAX_COMMENT]
+
+    def _release_held(self):
+        """
+        Include cases of held results in the run (one request for all of
+        them), then send the results.
+        """
+        held, self._held = self._held, []
+
+        new_case_ids = set(data['case_id'] for data in held) - self._case_ids
+        if new_case_ids:
+            self._case_ids |= new_case_ids
+            TestrailAPI.update_run(self.run.id, include_all=False,
+                                   case_ids=sorted(self._case_ids))
+
+        for data in held:
+            self.reporter.submit(self.run, data)
+
+    def pytest_sessionfinish(self, session):
+        if self.reporter is None:
+            return
+
+        self._release_held()
+        self.reporter.close()
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.reporter is None:
+            return
+
+        terminalreporter.write_sep('-', 'Testrail')
+        terminalreporter.write_line('%s results sent to run "%s" (%s)' % (
+            self.reporter.sent, self.run.name, self.run.url
+        ))
+        for data, error in self.reporter.errors:
+            terminalreporter.write_line('case C%s rejected: %s' % (
+                data['case_id'], error
+            ))
@@ -0,0 +1,366 @@
+# -*- coding:utf-8 -*-
+"""
+Fake Testrail server for tests: Testrail.get and Testrail.post are replaced by
+functions serving an in-memory database.
+"""
+
+from __future__ import absolute_import
+
+import os
+import sys
+import copy
+from collections import defaultdict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import testrail  # noqa: E402
+from testrail import Testrail  # noqa: E402
+
+STAMP = 1400000000
+
+READ_ONLY = (testrail.User, testrail.Priority, testrail.Status,
+             testrail.CaseType, testrail.CaseField, testrail.ResultField)
+READ_WRITE = (testrail.Project, testrail.Milestone, testrail.Suite,
+              testrail.Section, testrail.Case, testrail.Plan, testrail.Run,
+              testrail.Test, testrail.Result)
+
+
+def _run(run_id, suite_id, include_all=True, name=None):
+    attributes = dict.fromkeys([
+        'description', 'url', 'plan_id', 'milestone_id', 'assignedto_id',
+        'completed_on', 'config', 'passed_count', 'failed_count',
+        'retest_count', 'blocked_count', 'untested_count',
+        'custom_status1_count', 'custom_status2_count',
+        'custom_status3_count', 'custom_status4_count',
+        'custom_status5_count', 'custom_status6_count',
+        'custom_status7_count'
+    ])
+    attributes.update(id=run_id, name=name or 'Run %s' % run_id,
+                      project_id=1, suite_id=suite_id, created_on=STAMP,
+                      created_by=1, is_completed=False, config_ids=[],
+                      include_all=include_all)
+    return attributes
+
+
+def _custom_field(field_id, name, type_id, items=None):
+    options = {'is_required': False}
+    if items is not None:
+        options['items'] = items
+    return {
+        'id': field_id, 'type_id': type_id, 'name': name,
+        'system_name': 'custom_' + name, 'label': name, 'description': '',
+        'display_order': field_id,
+        'configs': [{'id': field_id,
+                     'context': {'is_global': False, 'project_ids': ['1']},
+                     'options': options}]
+    }
+
+
+def _ids(value):
+    return [int(i) for i in value.split(',')]
+
+
+class FakeServer(object):
+    """
+    Project 1 with suite 1 of sections Root > Child and Other, 'cases'
+    cases (case i in section i % 3 + 1) and run 1 including all of them
+    (test of case i has id 100 + i).
+
+    Attributes:
+       db           -- {table: list of payloads}
+       calls        -- list of (method, url) of requests
+       throttled    -- endpoint names answered as throttled (not a list)
+       exclusive    -- True to treat created_after/before as exclusive
+    """
+
+    def __init__(self, cases=10):
+        self.calls = []
+        self.throttled = set()
+        self.exclusive = False
+        self.clock = STAMP
+
+        self.db = {
+            'users': [{'id': 1, 'name': 'Alice', 'email': 'a@x',
+                       'is_active': True}],
+            'statuses': [
+                dict(id=i, name=name.lower(), label=name, is_system=True,
+                     is_untested=name == 'Untested', is_final=True,
+                     color_bright=0, color_medium=0, color_dark=0)
+                for i, name in ((1, 'Passed'), (2, 'Blocked'),
+                                (3, 'Untested'), (4, 'Retest'),
+                                (5, 'Failed'))
+            ],
+            'priorities': [dict(id=i, name=name, short_name=name,
+                                is_default=False, priority=i)
+                           for i, name in ((1, 'Low'), (2, 'High'))],
+            'case_types': [dict(id=1, name='Other', is_default=True)],
+            'case_fields': [_custom_field(1, 'area', 6, '1, A\n2, B'),
+                            _custom_field(2, 'notes', 3)],
+            'result_fields': [_custom_field(3, 'build', 1)],
+            'projects': [dict(id=1, name='P', url='', suite_mode=3,
+                              announcement='', show_announcement=False,
+                              is_completed=False, completed_on=None)],
+            'milestones': [],
+            'suites': [dict(id=1, project_id=1, name='S', description='',
+                            url='', is_master=True, is_baseline=False,
+                            is_completed=False, completed_on=None)],
+            'sections': [
+                dict(id=1, suite_id=1, name='Root', description='',
+                     display_order=1, parent_id=None, depth=0),
+                dict(id=2, suite_id=1, name='Child', description='',
+                     display_order=2, parent_id=1, depth=1),
+                dict(id=3, suite_id=1, name='Other', description='',
+                     display_order=3, parent_id=None, depth=0),
+            ],
+            'cases': [],
+            'runs': [_run(1, 1)],
+            'tests': [],
+            'results': [],
+            'plans': [],
+        }
+        for i in range(1, cases + 1):
+            self.db['cases'].append(dict(
+                id=i, suite_id=1, section_id=i % 3 + 1, title='Case %s' % i,
+                type_id=1, priority_id=1, milestone_id=None, refs=None,
+                estimate=None, estimate_forecast=None, created_on=STAMP,
+                created_by=1, updated_on=STAMP, updated_by=1,
+                custom_area=1, custom_notes='notes %s' % i
+            ))
+            self.add_test(1, self.db['cases'][-1])
+
+    def add_test(self, run_id, case):
+        self.db['tests'].append(dict(
+            id=100 + len(self.db['tests']) + 1, run_id=run_id,
+            case_id=case['id'], status_id=3, title=case['title'], type_id=1,
+            priority_id=1, milestone_id=None, refs=None, estimate=None,
+            estimate_forecast=None, assignedto_id=None, custom_area=1,
+            custom_notes=case['custom_notes']
+        ))
+
+    def add_result(self, test_id, status_id=1, created_on=None, **fields):
+        result = dict(id=len(self.db['results']) + 1, test_id=test_id,
+                      status_id=status_id, version=None,
+                      created_on=self.clock if created_on is None
+                      else created_on,
+                      created_by=1, assignedto_id=None, comment=None,
+                      elapsed=None, defects=None, custom_build=None)
+        result.update(fields)
+        self.db['results'].append(result)
+        if status_id:
+            for test in self.db['tests']:
+                if test['id'] == test_id:
+                    test['status_id'] = status_id
+        return result
+
+    def _one(self, table, object_id):
+        for row in self.db[table]:
+            if row['id'] == int(object_id):
+                return row
+        raise testrail.NotFound('No %s %s' % (table, object_id))
+
+    def _created(self, rows, params):
+        after = params.get('created_after')
+        before = params.get('created_before')
+        if after is not None:
+            after = int(after) + (1 if self.exclusive else 0)
+            rows = [r for r in rows if r['created_on'] >= after]
+        if before is not None:
+            before = int(before) - (1 if self.exclusive else 0)
+            rows = [r for r in rows if r['created_on'] <= before]
+        return rows
+
+    @staticmethod
+    def _page(rows, params):
+        rows = rows[int(params.get('offset', 0)):]
+        if 'limit' in params:
+            rows = rows[:int(params['limit'])]
+        return rows
+
+    def get(self, url, **kwargs):
+        self.calls.append(('GET', url))
+
+        parts = url.split('&')
+        path = parts[0].split('/')
+        name, args = path[0], path[1:]
+        params = dict(part.split('=', 1) for part in parts[1:])
+
+        if name in self.throttled:
+            return defaultdict(lambda: None)
+
+        plain = {'get_users': 'users', 'get_statuses': 'statuses',
+                 'get_priorities': 'priorities',
+                 'get_case_types': 'case_types',
+                 'get_case_fields': 'case_fields',
+                 'get_result_fields': 'result_fields',
+                 'get_projects': 'projects', 'get_milestones': 'milestones',
+                 'get_suites': 'suites', 'get_plans': 'plans'}
+        single = {'get_project': 'projects', 'get_suite': 'suites',
+                  'get_section': 'sections', 'get_case': 'cases',
+                  'get_run': 'runs', 'get_test': 'tests',
+                  'get_milestone': 'milestones', 'get_plan': 'plans'}
+
+        if name in plain:
+            rows = self.db[plain[name]]
+        elif name in single:
+            rows = self._one(single[name], args[0])
+        elif name == 'get_sections':
+            rows = [s for s in self.db['sections']
+                    if s['suite_id'] == int(params['suite_id'])]
+        elif name == 'get_cases':
+            rows = [c for c in self.db['cases']
+                    if c['suite_id'] == int(params['suite_id'])]
+            if 'section_id' in params:
+                rows = [c for c in rows
+                        if c['section_id'] == int(params['section_id'])]
+        elif name == 'get_runs':
+            rows = self._page(self._created(
+                [r for r in self.db['runs'] if r['plan_id'] is None], params
+            ), params)
+        elif name == 'get_tests':
+            rows = [t for t in self.db['tests']
+                    if t['run_id'] == int(args[0])]
+        elif name in ('get_results_for_run', 'get_results'):
+            if name == 'get_results':
+                test_ids = set([int(args[0])])
+            else:
+                test_ids = set(t['id'] for t in self.db['tests']
+                               if t['run_id'] == int(args[0]))
+            rows = [r for r in self.db['results'] if r['test_id'] in test_ids]
+            if 'status_id' in params:
+                rows = [r for r in rows
+                        if r['status_id'] in _ids(params['status_id'])]
+            rows = self._created(rows, params)
+            rows = sorted(rows, key=lambda r: (-r['created_on'], -r['id']))
+            rows = self._page(rows, params)
+        else:
+            raise AssertionError('Unexpected GET %s' % url)
+
+        return copy.deepcopy(rows)
+
+    def post(self, url, data=None, **kwargs):
+        self.calls.append(('POST', url))
+
+        path = url.split('&')[0].split('/')
+        name, args = path[0], path[1:]
+        data = data or {}
+
+        if name in self.throttled:
+            return defaultdict(lambda: None)
+
+        if name in ('add_results', 'add_results_for_cases'):
+            run_id = int(args[0])
+            tests = []
+            for item in data['results']:
+                key = 'id' if name == 'add_results' else 'case_id'
+                value = item['test_id' if key == 'id' else 'case_id']
+                matched = [t for t in self.db['tests']
+                           if t['run_id'] == run_id and t[key] == int(value)]
+                if not matched:
+                    raise testrail.NotFound('Field :results cannot be parsed')
+                tests.append(matched[0])
+
+            created = []
+            for test, item in zip(tests, data['results']):
+                fields = dict((k, v) for k, v in item.items()
+                              if k not in ('test_id', 'case_id',
+                                           'status_id'))
+                created.append(self.add_result(
+                    test['id'], item.get('status_id'), **fields
+                ))
+            return copy.deepcopy(created)
+
+        if name == 'add_run':
+            run = _run(len(self.db['runs']) + 1, data['suite_id'],
+                       data.get('include_all', True), data.get('name'))
+            self.db['runs'].append(run)
+            case_ids = [int(i) for i in data.get('case_ids') or ()]
+            for case in self.db['cases']:
+                if run['include_all'] or case['id'] in case_ids:
+                    self.add_test(run['id'], case)
+            return copy.deepcopy(run)
+
+        if name == 'update_run':
+            run = self._one('runs', args[0])
+            have = set(t['case_id'] for t in self.db['tests']
+                       if t['run_id'] == run['id'])
+            for case_id in data.get('case_ids', ()):
+                if int(case_id) not in have:
+                    self.add_test(run['id'], self._one('cases', case_id))
+            return copy.deepcopy(run)
+
+        if name == 'add_section':
+            section = dict(id=max(s['id'] for s in self.db['sections']) + 1,
+                           suite_id=data['suite_id'], name=data['name'],
+                           description=data.get('description'),
+                           display_order=0, parent_id=data.get('parent_id'),
+                           depth=0)
+            self.db['sections'].append(section)
+            return copy.deepcopy(section)
+
+        if name == 'add_case':
+            section = self._one('sections', args[0])
+            case = dict(id=max(c['id'] for c in self.db['cases']) + 1,
+                        suite_id=section['suite_id'],
+                        section_id=section['id'], type_id=1, priority_id=1,
+                        milestone_id=None, refs=None, estimate=None,
+                        estimate_forecast=None, created_on=STAMP,
+                        created_by=1, updated_on=STAMP, updated_by=1,
+                        custom_area=None, custom_notes=None)
+            case.update(data)
+            case['estimate'] = self.normalize_estimate(case['estimate'])
+            self.db['cases'].append(case)
+            return copy.deepcopy(case)
+
+        if name == 'update_case':
+            case = self._one('cases', args[0])
+            case.update(data)
+            case['estimate'] = self.normalize_estimate(case['estimate'])
+            return copy.deepcopy(case)
+
+        if name == 'delete_case':
+            self.db['cases'].remove(self._one('cases', args[0]))
+            return None
+
+        if name == 'delete_section':
+            self.db['sections'].remove(self._one('sections', args[0]))
+            return None
+
+        raise AssertionError('Unexpected POST %s' % url)
+
+    @staticmethod
+    def normalize_estimate(estimate):
+        # server stores estimates in its own format: "90s" -> "1m 30s"
+        if estimate is None:
+            return None
+        return testrail._seconds_to_timespan(
+            testrail._timespan_to_seconds(estimate)
+        )
+
+    def posts(self, prefix=''):
+        return [url for method, url in self.calls
+                if method == 'POST' and url.startswith(prefix)]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeServer()
+
+    monkeypatch.setattr(Testrail, 'get', staticmethod(fake.get))
+    monkeypatch.setattr(Testrail, 'post', staticmethod(fake.post))
+    monkeypatch.setattr(Testrail, 'lazy', False)
+    monkeypatch.setattr(Testrail, 'intern_strings', False)
+    monkeypatch.setattr(Testrail, 'strings', {})
+    monkeypatch.setattr(Testrail, 'metadata_ttl', None)
+    monkeypatch.setattr(Testrail, 'max_strings', None)
+    monkeypatch.setattr(Testrail, 'reporter', None)
+
+    for object_class in READ_ONLY:
+        monkeypatch.setattr(object_class, 'cache', None)
+    for object_class in READ_WRITE:
+        monkeypatch.setattr(object_class, 'cache', {})
+    Testrail._metadata_loaded.clear()
+
+    return fake
+
@@ -0,0 +1,459 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import absolute_import
+
+import gc
+import os
+import time
+import weakref
+
+import pytest
+
+import testrail
+
+
+################################################################################
+# Lazy mode
+
+def test_lazy_settles_only_declared_custom_fields(server, monkeypatch):
+    monkeypatch.setattr(testrail.Testrail, 'lazy', True)
+    server.db['tests'][0]['custom_undeclared'] = 'x'
+
+    test = testrail.Testrail.get_test_by_id(101)
+
+    assert test.custom_area == 1
+    assert test.custom_notes == 'notes 1'
+    with pytest.raises(AttributeError):
+        test.custom_undeclared
+
+
+def test_lazy_resettle_forgets_eager_values(server, monkeypatch):
+    test = testrail.Testrail.get_test_by_id(101)
+    assert test.custom_notes == 'notes 1'
+
+    monkeypatch.setattr(testrail.Testrail, 'lazy', True)
+    payload = dict(server.db['tests'][0], custom_notes='changed')
+    test._settle_attributes(payload)
+
+    assert test.custom_notes == 'changed'
+
+    test._settle_attributes(dict(payload, custom_notes='again'))
+    assert test.custom_notes == 'again'
+
+
+################################################################################
+# Columnar Tables
+
+def _results_table(statuses):
+    payloads = [dict(id=i, test_id=100 + i, status_id=status, created_by=1,
+                     assignedto_id=None, created_on=1400000000 + i,
+                     elapsed='1.5m', version=None, defects=None,
+                     comment=None)
+                for i, status in enumerate(statuses)]
+    return testrail.Table.from_payloads(payloads,
+                                        testrail.Table.RESULT_COLUMNS)
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_group_by_keeps_row_order_in_groups(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(testrail, 'numpy', None)
+    elif testrail.numpy is None:
+        pytest.skip('numpy is not installed')
+
+    table = _results_table([5, 1, 5, 3, 1, 5])
+    groups = table.group_by('status_id')
+
+    assert sorted(groups) == [1, 3, 5]
+    assert list(groups[5]['id']) == [0, 2, 5]
+    assert list(groups[1]['id']) == [1, 4]
+    assert list(groups[3]['id']) == [3]
+    assert _results_table([]).group_by('status_id') == {}
+
+
+def test_timespan_with_fractions():
+    assert testrail._timespan_to_seconds('1.5h') == 5400
+    assert testrail._timespan_to_seconds('1m 30s') == 90
+    assert testrail._timespan_to_seconds('2x 10s') == 10
+    assert testrail._timespan_to_seconds(None) == 0
+    assert list(_results_table([1])['elapsed']) == [90]
+
+
+################################################################################
+# Shared strings
+
+def test_intern_strings_is_bounded_and_skips_titles(server, monkeypatch):
+    monkeypatch.setattr(testrail.Testrail, 'intern_strings', True)
+    monkeypatch.setattr(testrail.Testrail, 'max_strings', 1)
+    monkeypatch.setattr(testrail, '_field_names', {})
+    for i, test in enumerate(server.db['tests']):
+        test['estimate'] = '%sm' % i
+
+    tests = testrail.Testrail.get_run_by_id(1).tests()
+
+    assert len(testrail.Testrail.strings) == 1
+    assert tests[0].title not in testrail.Testrail.strings
+    assert [t.estimate for t in tests][:2] == ['0m', '1m']
+    # custom fields of the project are resolved once for all tests
+    assert len(testrail._field_names) == 1
+
+
+################################################################################
+# Batch uploads
+
+def test_batch_sends_full_chunks_and_rest_on_exit(server):
+    run = testrail.Testrail.get_run_by_id(1)
+    tests = run.tests()
+
+    with run.batch(size=4) as batch:
+        for test in tests:
+            batch.set_passed(test)
+        batch.add_result_for_case(tests[0].case, 'Failed')
+        assert len(server.posts('add_results/')) == 2
+
+    assert len(server.posts('add_results/')) == 3
+    assert len(server.posts('add_results_for_cases/')) == 1
+    assert len(batch.results) == 11
+    assert batch.errors == []
+
+
+def test_batch_sends_after_interval(server, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(testrail.time, 'time', lambda: clock[0])
+    run = testrail.Testrail.get_run_by_id(1)
+    tests = run.tests()
+
+    batch = run.batch(size=100, interval=5)
+    batch.set_passed(tests[0])
+    assert server.posts() == []
+
+    clock[0] += 5
+    batch.set_passed(tests[1])
+    assert len(server.posts('add_results/')) == 1
+    assert len(batch.results) == 2
+
+
+def test_batch_reports_rejected_results(server):
+    run = testrail.Testrail.get_run_by_id(1)
+    tests = run.tests()
+    missing = testrail.Test.__new__(testrail.Test)
+    missing.__dict__.update(id=999, run_id=1)
+
+    with run.batch(size=10) as batch:
+        batch.set_passed(tests[0])
+        batch.set_passed(missing)
+
+    assert len(batch.results) == 1
+    assert [item['test_id'] for item, error in batch.errors] == [999]
+
+
+################################################################################
+# Background uploads
+
+@pytest.mark.parametrize('interval', [None, 60])
+def test_reporter_sends_by_size_and_flush(server, interval):
+    run = testrail.Testrail.get_run_by_id(1)
+    tests = run.tests()
+    reporter = testrail.AsyncReporter(size=3, interval=interval, workers=1)
+
+    try:
+        for test in tests[:4]:
+            reporter.set_passed(test)
+        reporter.flush()
+        assert reporter.sent == 4
+        assert len(server.posts('add_results/')) == 2
+
+        reporter.add_result_for_case(run, tests[4].case, 'Failed')
+    finally:
+        reporter.close()
+
+    assert reporter.sent == 5
+    assert reporter.errors == []
+    assert len(server.posts('add_results_for_cases/')) == 1
+
+
+def test_reporter_takes_results_of_tests(server):
+    run = testrail.Testrail.get_run_by_id(1)
+    test = run.tests()[0]
+    testrail.Testrail.reporter = testrail.AsyncReporter(workers=1)
+    reporter = testrail.Testrail.reporter
+
+    assert test.set_failed(comment='boom') is None
+    reporter.close()
+
+    assert testrail.Testrail.reporter is None
+    assert reporter.sent == 1
+    assert server.db['results'][-1]['comment'] == 'boom'
+
+
+################################################################################
+# Spool
+
+def test_spool_keeps_record_after_line_cut_by_crash(server, tmpdir):
+    run = testrail.Testrail.get_run_by_id(1)
+    tests = run.tests()
+    path = str(tmpdir.join('spool'))
+    spool = testrail.ResultSpool(path)
+
+    spool.set_passed(tests[0])
+    with open(path, 'a') as journal:
+        journal.write('{"id": "cut", "run_')
+    spool.set_failed(tests[1])
+
+    assert [r['result']['test_id'] for r in spool.pending()] == [101, 102]
+    assert spool.drain() == (2, [])
+    assert spool.pending() == []
+
+
+def test_spool_drain_does_not_resend_after_crash(server, tmpdir,
+                                                 monkeypatch):
+    server.clock = int(time.time())
+    run = testrail.Testrail.get_run_by_id(1)
+    tests = run.tests()
+    spool = testrail.ResultSpool(str(tmpdir.join('spool')))
+    for test in tests[:3]:
+        spool.set_passed(test, comment='same')
+    spool.set_passed(tests[0], comment='same')
+
+    # crash after the server stored the chunk, before anything was recorded
+    with monkeypatch.context() as patch:
+        patch.setattr(testrail.UploadJournal, 'commit', lambda *args: None)
+        assert spool.drain()[0] == 4
+    os.remove(spool.done_path)
+
+    assert spool.drain() == (0, [])
+    assert spool.pending() == []
+    assert len(server.db['results']) == 4
+
+
+def test_journal_recovers_chunk_despite_clock_skew(server, tmpdir,
+                                                   monkeypatch):
+    # server clock is 10 minutes behind the local one
+    server.clock = int(time.time()) - 10 * 60
+    run = testrail.Testrail.get_run_by_id(1)
+    tests = run.tests()
+    results = [{'test_id': t.id, 'status_id': 1, 'comment': 'ok'}
+               for t in tests[:3]]
+    path = str(tmpdir.join('journal'))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(testrail.UploadJournal, 'commit', lambda *args: None)
+        run.add_results(results, journal=testrail.UploadJournal(path))
+
+    run.add_results(results, journal=testrail.UploadJournal(path))
+    assert len(server.db['results']) == 3
+
+
+################################################################################
+# JUnit Import
+
+JUNIT_REPORT = b'''<?xml version="1.0" encoding="UTF-8"?>
+<testsuites>
+  <testsuite name="s">
+    <testcase classname="m" name="Case 1" time="1.2"/>
+    <testcase classname="m" name="test_two" time="3">
+      <properties><property name="testrail_case_id" value="C2"/></properties>
+      <failure message="boom">trace</failure>
+    </testcase>
+    <testcase classname="m" name="test_unknown"><skipped/></testcase>
+  </testsuite>
+</testsuites>
+'''
+
+
+def test_import_junit_from_pipe(server):
+    read_end, write_end = os.pipe()
+    os.write(write_end, JUNIT_REPORT)
+    os.close(write_end)
+
+    suite = testrail.Testrail.get_suite_by_id(1)
+    with os.fdopen(read_end, 'rb') as report:
+        imported = testrail.import_junit(report, suite, run_name='CI')
+
+    assert imported.run.name == 'CI'
+    assert imported.sent == 2
+    assert imported.errors == []
+    assert imported.unmatched == ['m.test_unknown']
+    assert server.posts('add_run/') and not server.posts('update_run/')
+    assert len(server.posts('add_results_for_cases/')) == 1
+    assert [(r['test_id'], r['status_id']) for r in server.db['results']] \
+        == [(111, 1), (112, 5)]
+
+
+def test_import_junit_adds_cases_to_run_once(server, tmpdir):
+    path = tmpdir.join('report.xml')
+    path.write_binary(JUNIT_REPORT)
+    suite = testrail.Testrail.get_suite_by_id(1)
+    run = suite.add_run(name='Partial', include_all=False, cases=[3])
+
+    imported = testrail.import_junit(str(path), suite, run=run)
+
+    assert imported.sent == 2
+    assert len(server.posts('update_run/')) == 1
+
+
+################################################################################
+# Suite sync
+
+def _sync_tree():
+    return {'Root': {'sections': {'Child': {'cases': [
+        {'title': 'Case 1', 'estimate': '90s'},
+        {'title': 'Case 4', 'refs': 'JIRA-4'},
+        {'title': 'New case', 'priority': 'High'},
+    ]}}}}
+
+
+def test_sync_plan_compares_values_as_server_stores_them(server):
+    server.db['cases'][0]['estimate'] = '1m 30s'
+    suite = testrail.Testrail.get_suite_by_id(1)
+
+    plan = testrail.SuiteSync(suite, _sync_tree()).plan()
+
+    assert plan.add_sections == [] and plan.update_sections == []
+    assert [spec['title'] for spec in plan.add_cases] == ['New case']
+    assert [spec['id'] for spec in plan.update_cases] == [4]
+    assert plan.delete_cases == [] and plan.delete_sections == []
+
+
+def test_sync_deletes_only_when_asked(server):
+    suite = testrail.Testrail.get_suite_by_id(1)
+
+    plan = testrail.SuiteSync(suite, _sync_tree(), delete=True).plan()
+
+    # cases of Other go with the section
+    assert sorted(plan.delete_cases) == [3, 6, 7, 9, 10]
+    assert [section.name for section in plan.delete_sections] == ['Other']
+
+
+def test_sync_without_changes_sends_nothing(server):
+    suite = testrail.Testrail.get_suite_by_id(1)
+    plan, errors = suite.sync(_sync_tree())
+    assert errors == []
+    server.calls[:] = []
+
+    plan, errors = suite.sync(_sync_tree())
+
+    assert errors == []
+    assert server.posts() == []
+    assert not any(plan)
+
+
+def test_sync_refuses_duplicate_section_paths(server):
+    server.db['sections'].append(dict(server.db['sections'][2], id=4))
+    suite = testrail.Testrail.get_suite_by_id(1)
+
+    with pytest.raises(ValueError):
+        testrail.SuiteSync(suite, _sync_tree()).plan()
+
+
+################################################################################
+# Sections
+
+def test_section_by_path_refuses_ambiguous_paths(server):
+    server.db['sections'].append(dict(server.db['sections'][2], id=4))
+    suite = testrail.Testrail.get_suite_by_id(1)
+
+    assert suite.get_section_by_path('Root', 'Child').id == 2
+    with pytest.raises(ValueError):
+        suite.get_section_by_path('Other')
+    with pytest.raises(testrail.NotFound):
+        suite.get_section_by_path('Root', 'Missing')
+
+    suite.add_section('Child', parent=suite.get_section_by_path('Root'))
+    with pytest.raises(ValueError):
+        suite.get_section_by_path('Root', 'Child')
+
+
+################################################################################
+# Time window scans
+
+def _scan(server, **kwargs):
+    run = testrail.Testrail.get_run_by_id(1)
+    del server.calls[:]
+    results = run.results(raw=True, **kwargs)
+    requests = len([url for method, url in server.calls
+                    if url.startswith('get_results_for_run/')])
+    return [r['id'] for r in results], requests
+
+
+def _serial_scan(server, after, before):
+    ids, offset, requests = [], 0, 0
+    while True:
+        url = 'get_results_for_run/1&created_after=%s&created_before=%s' \
+              '&limit=250&offset=%s' % (after, before, offset)
+        rows = server.get(url)
+        requests += 1
+        ids.extend(r['id'] for r in rows)
+        offset += len(rows)
+        if len(rows) < 250:
+            return ids, requests
+
+
+@pytest.mark.parametrize('exclusive', [False, True])
+@pytest.mark.parametrize('layout', ['uniform', 'bursty'])
+def test_windowed_scan_matches_serial_paging(server, exclusive, layout):
+    start, days = 1400000000, 30
+    end = start + days * 24 * 3600
+    for i in range(6000):
+        if layout == 'uniform':
+            created_on = start + i * (end - start) // 6000
+        else:
+            # a minute of heavy load in the middle of a month
+            created_on = start + days * 12 * 3600 + i // 100
+        server.add_result(101 + i % 10, created_on=created_on)
+    server.exclusive = exclusive
+
+    ids, requests = _scan(server, created_after=start, created_before=end,
+                          workers=8)
+    serial_ids, serial_requests = _serial_scan(server, start, end)
+
+    assert ids == serial_ids
+    # one extra request per window at most
+    assert requests <= serial_requests + 8
+
+
+################################################################################
+# Eager loading
+
+def test_tests_include_related_objects_in_few_requests(server):
+    server.add_result(101, status_id=5)
+    server.add_result(101, status_id=1, created_on=server.clock + 1)
+    run = testrail.Testrail.get_run_by_id(1)
+    run.suite.custom_case_fields
+    del server.calls[:]
+
+    tests = run.tests(include=['case', 'latest_result'])
+
+    assert len(server.calls) == 3
+    assert tests[0].case.title == 'Case 1'
+    assert tests[0].latest_result.status_id == 1
+    assert tests[1].latest_result is None
+    assert len(server.calls) == 3
+
+    with pytest.raises(ValueError):
+        run.tests(include=['unknown'])
+
+
+################################################################################
+# Service mode
+
+def test_metadata_list_is_a_copy(server):
+    statuses = testrail.Testrail._get_objects_list(testrail.Status)
+    assert isinstance(statuses, list)
+
+    statuses = testrail.Testrail._get_objects_list(testrail.Status)
+    assert isinstance(statuses, list)
+    assert sorted(s.id for s in statuses) == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.skipif(not hasattr(testrail.atexit, 'unregister'),
+                    reason='atexit.unregister is missing in Python 2')
+def test_closed_reporter_is_released(server):
+    reporter = testrail.AsyncReporter(workers=1)
+    reporter.close()
+    released = weakref.ref(reporter)
+
+    del reporter
+    gc.collect()
+
+    assert released() is None